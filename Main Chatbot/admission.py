@@ -0,0 +1,112 @@
+# Admission control for /chat: a bounded concurrency gate with a limited
+# wait queue, and per-client token-bucket rate limiting
+import threading
+import time
+from collections import OrderedDict
+
+
+class AdmissionRejected(Exception):
+    """Raised where a request is turned away; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"request rejected, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """Lets at most ``max_concurrent`` requests run and ``max_queue`` wait.
+
+    A request that finds the queue full, or waits longer than
+    ``queue_timeout`` seconds, is rejected instead of piling up behind slow
+    upstream calls.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=8, queue_timeout=2.0):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            with self.lock:
+                self.running += 1
+            return True
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.waiting += 1
+        admitted = self.slots.acquire(timeout=self.queue_timeout)
+        with self.lock:
+            self.waiting -= 1
+            if admitted:
+                self.running += 1
+            else:
+                self.rejected += 1
+        return admitted
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+        self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected}
+
+
+class RateLimiter:
+    """Token bucket per client: ``rate`` requests/second with bursts up to ``burst``.
+
+    ``reserve`` takes a token in one step, so concurrent requests can never
+    pass on the same token; ``refund`` gives it back to a request that turned
+    out not to cost an upstream call. A ``rate`` of 0 (or less) turns the
+    limit off.
+    """
+
+    def __init__(self, rate=1.0, burst=5, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # client -> (tokens, last refill time), least recently seen first
+        self.lock = threading.Lock()
+        self.limited = 0
+
+    # Refilled token count for a client; call with the lock held
+    def _tokens(self, client, now):
+        tokens, last = self.buckets.pop(client, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def _store(self, client, tokens, now):
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+
+    # Takes a token if there is one; returns (allowed, seconds until the next token is available)
+    def reserve(self, client):
+        if self.rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        with self.lock:
+            tokens = self._tokens(client, now)
+            if tokens < 1:
+                self._store(client, tokens, now)
+                self.limited += 1
+                return False, (1 - tokens) / self.rate
+            self._store(client, tokens - 1, now)
+        return True, 0.0
+
+    def refund(self, client):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self._store(client, self._tokens(client, now) + 1, now)
+
+    def stats(self):
+        with self.lock:
+            return {"clients": len(self.buckets), "limited": self.limited}
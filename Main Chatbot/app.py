@@ -1,20 +1,30 @@
 # Import necessary libraries
+import time
+STARTED = time.perf_counter()  # Start of app import, for startup timings
 import os
 import csv
+import math
+import hmac
+import json
+import hashlib
 import logging
+import functools
 from flask import send_file 
 from datetime import datetime
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS  # Enable CORS
-from langchain_community.document_loaders import TextLoader
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import Chroma
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
+from werkzeug.middleware.proxy_fix import ProxyFix
+from knowledge import load_records, to_documents
+from intent import IntentClassifier, TRAIN_FILES, route, routing_margins
+from llm import get_chat_model, get_embeddings, reset_clients, breaker, CircuitOpenError, FALLBACK_REPLY, usage_totals
+from singleflight import SingleFlight, request_key
+from admission import AdmissionRejected, ConcurrencyGate, RateLimiter
+from startup import StagedStartup
+from profiling import SamplingProfiler, MemoryDiagnostics
+from sessionstore import create_store
+# langchain, numpy and the OpenAI client are imported by the startup stages
+# below rather than here, so health checks and log downloads answer straight away
 
 # Load environment variables
 load_dotenv()
@@ -36,78 +46,156 @@ logging.basicConfig(filename=log_filename_txt, level=logging.INFO, format='%(asc
 # Initialise Flask app with CORS enabled
 app = Flask(__name__)
 CORS(app)
+# Trust only the X-Forwarded-For entries appended by our own proxies (one on the
+# hosting platform), so request.remote_addr is the address the proxy saw and not
+# whatever the client put at the front of the header
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv("TRUSTED_PROXIES", "1")))
+
+KNOWLEDGE_FILE = 'prepared_data_ver3.txt'
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "1") != "0"
+# Confidence margins above which the predicted category labels the prompt and boosts its
+# records (INTENT_MARGIN) or restricts retrieval to them (INTENT_FILTER_MARGIN). Unset, they
+# are calibrated on the validation split each time the knowledge is loaded (see intent.py)
+def margin_setting(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+INTENT_MARGIN = margin_setting("INTENT_MARGIN")
+INTENT_FILTER_MARGIN = margin_setting("INTENT_FILTER_MARGIN")
+
+# Identical questions arriving together share one upstream computation
+coalescer = SingleFlight()
+
+# Admission control: bounded concurrency with a short wait queue, plus rate limits on
+# requests that reach the model. Visitors are limited per chat session (per address
+# when they send none), so a classroom behind one NAT isn't throttled as one client;
+# a looser per-address limit stops one machine minting sessions to get round it.
+# A rate of 0 turns that limit off
+gate = ConcurrencyGate(
+    max_concurrent=int(os.getenv("CHAT_MAX_CONCURRENT", "4")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "8")),
+    queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "2"))
+)
+rate_limiter = RateLimiter(
+    rate=float(os.getenv("CHAT_RATE", "1")),
+    burst=int(os.getenv("CHAT_BURST", "5"))
+)
+address_limiter = RateLimiter(
+    rate=float(os.getenv("CHAT_ADDRESS_RATE", "10")),
+    burst=int(os.getenv("CHAT_ADDRESS_BURST", "60"))
+)
+
+# Created by the startup stages
+reloader = None
+
+# Conversation history and cached answers, shared between workers and instances
+# when SESSION_STORE_URL names a Redis or SQLite backend
+sessions = create_store(os.getenv("SESSION_STORE_URL"))
+
+# Admin diagnostics (profiling and memory snapshots), only available when ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+profiler = SamplingProfiler()
+memory_diagnostics = MemoryDiagnostics()
+
+# Everything built from one version of the knowledge file
+class KnowledgeIndex:
+    def __init__(self, file_path, version):
+        self.version = version
+        self.records = load_records(file_path)
+        # Identifies the knowledge across instances and restarts, unlike the per-process version
+        self.content_hash = hashlib.sha1(json.dumps(self.records, sort_keys=True).encode("utf-8")).hexdigest()
+        self.docs = to_documents(self.records, source=file_path)
+        from retrieval import BM25Index
+        self.keyword_index = BM25Index(self.docs)
+        # Local intent classifier, trained from the labelled input files and the
+        # knowledge file so it also knows every category the bot can answer
+        self.intent_classifier = IntentClassifier.from_files(TRAIN_FILES + [file_path])
+        margin, filter_margin = routing_margins(self.intent_classifier, TRAIN_FILES + [file_path])
+        self.intent_margin = INTENT_MARGIN if INTENT_MARGIN is not None else margin
+        self.filter_margin = INTENT_FILTER_MARGIN if INTENT_FILTER_MARGIN is not None else filter_margin
+        # Embeddings live in a memory-mapped file that every worker process shares;
+        # only records missing from earlier index files are embedded
+        from sharedindex import SharedVectorIndex
+        self.vector_store = SharedVectorIndex.load_or_build(self.docs, get_embeddings())
+        self.embedded = self.vector_store.embedded
+        # Follow-up suggestions per record, computed once per index version and stored beside it
+        from followups import compute_followups
+        self.followups = self.vector_store.sidecar(
+            "followups", lambda: compute_followups(self.records, self.vector_store.vectors)
+        )
+        self.record_index = {doc.page_content: i for i, doc in enumerate(self.docs)}
+
+    # Suggested follow-up for the first retrieved record, without any model tokens
+    def follow_up(self, docs):
+        from followups import follow_up_text
+        for doc in docs:
+            i = self.record_index.get(doc.page_content)
+            if i is not None:
+                return follow_up_text(self.records, self.followups[i])
+        return ""
+
+def build_knowledge(file_path, version):
+    knowledge = KnowledgeIndex(file_path, version)
+    logging.info(f"Knowledge version {version}: {len(knowledge.records)} records, "
+                 f"{knowledge.embedded} embedded, the rest reused; intent margin {knowledge.intent_margin}, "
+                 f"filter margin {knowledge.filter_margin}")
+    return knowledge
+
+# Canned-response layer: best keyword-matching record, answered without any upstream call
+def degraded_answer(question):
+    knowledge = reloader.current if reloader else None
+    matches = knowledge.keyword_index.search(question, k=1) if knowledge else []
+    if not matches:
+        return FALLBACK_REPLY
+    return knowledge.records[matches[0][0]]["response"].strip('"“” ')
 
 class Assistant:
-    def __init__(self, file_path, context):
+    def __init__(self, knowledge, context):
         self.context = context
-        self.docs = self.load_text(file_path)
-        self.vectorStore = self.create_db(self.docs)
+        self.knowledge = knowledge
+        self.docs = knowledge.docs
+        self.vectorStore = knowledge.vector_store
         self.chain = self.create_chain()
         self.chat_history = []  # Chat history for each session
         self.question_count = 0
 
-    # Load text from file
-    def load_text(self, file_path):
-        loader = TextLoader(file_path, encoding='utf-8')
-        return loader.load()
-
-    # Create vector database
-    def create_db(self, docs):
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        embedding = OpenAIEmbeddings(openai_api_key=openai_api_key)
-        return Chroma.from_documents(docs, embedding=embedding)
-
     # Create conversation chain with new prompt template
     def create_chain(self):
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        model = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.5,
-            api_key=openai_api_key
-        )
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain.chains import create_retrieval_chain
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain.chains.history_aware_retriever import create_history_aware_retriever
+        from prompts import build_chat_prompt
+        from retrieval import HybridRetriever, create_speculative_retriever
 
-        # New prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", 
-             "You are a friendly and helpful AI assistant chatbot guiding users on how to navigate the Atlas map, based on {context}. "
-             "Your primary goal is to assist users with navigation while being approachable and open to casual conversation."),
-            ("system", "Context: {context}"),
-            ("system", 
-             "Instructions for {context}:"
-             "\n1. Engage with users in a friendly manner, responding positively to greetings."
-             "\n   For example, if the user says 'Hello,' respond warmly and ask how you can help."
-             "\n2. Clarify vague, ambiguous, or one-word queries before providing a full response. If the user's input is unclear, misspelled, or potentially mistyped, ask for clarification."
-             "\n3. For data search queries on a specific theme or subcategory, respond exactly with: 'To find data on [theme], open the Atlas map, navigate to the right-hand side pane, and type [theme] in the search box. If data is available, select the subcategory of interest from the drop-down options.'"
-             "\n   For example, if the user asks about 'assault,' respond exactly with: 'To find data on assault, open the Atlas map, navigate to the right-hand side pane, and type 'assault' in the search box. If data is available, select the subcategory of interest from the drop-down options.'"
-             "\n   For example, if the user asks about 'suicide,' respond exactly with: 'To find data on suicide, open the Atlas map, navigate to the right-hand side pane, and type 'suicide' in the search box. If data is available, select the subcategory of interest from the drop-down options.'"
-             "\n   For example, if the user asks about 'alcohol-related hospital admissions,' respond exactly with: 'To find data on hospital admissions, open the Atlas map, navigate to the right-hand side pane, and type 'alcohol related' in the search box. If data is available, select the subcategory of interest from the drop-down options.'"
-             "\n4. If the user asks about 'latest data' or data for a specific period, let them know they should first search for their theme of interest. They can then filter the data by clicking the 'calendar' icon and selecting the relevant year."
-             "\n5. Always relate your responses to the user's original query, regardless of the theme or indicator."
-             "\n6. Never interpret the data, even if the user asks you to. Instead, explain that you can only assist with map navigation queries."
-             "\n7. If data is available, provide the exact information exactly as it appears in the text file, without making any changes."
-             "\n   For example, if the user asks how results are calculated, always respond with the exact wording provided: 'For more information about how results were calculated, refer to Homepage -> Main Menu options -> Technical Information.'"
-             "\n8. If you provide information about external resources, such as the Australian Bureau of Statistics (ABS) website, include a correct and functional clickable link to the relevant site."),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            ("system", 
-             "Ensure your responses are concise, clear, and helpful. Limit each response to a maximum of three sentences, and use Australian English spelling.")
-        ])
+        # Shared, connection-pooled model with timeouts and bounded retries
+        model = get_chat_model(model="gpt-4o-mini", temperature=0.5)
+
+        # Static instructions first so every request shares a cacheable prompt prefix
+        prompt = build_chat_prompt(self.context)
 
         chain = create_stuff_documents_chain(
             llm=model,
             prompt=prompt
         )
 
-        retriever = self.vectorStore.as_retriever(search_kwargs={"k": 1})
+        # BM25 over record keywords fused with vector similarity; keyword-only questions skip embeddings
+        self.retriever = HybridRetriever(
+            index=self.knowledge.keyword_index,
+            vector_store=self.vectorStore,
+            search_kwargs={"k": 1}
+        )
         retriever_prompt = ChatPromptTemplate.from_messages([
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             ("human", f"Generate a search query based on the conversation about {self.context}.")
         ])
 
-        history_aware_retriever = create_history_aware_retriever(
+        # Speculative mode retrieves for the raw question while the model rewrites it
+        create_retriever = create_speculative_retriever if SPECULATIVE_RETRIEVAL else create_history_aware_retriever
+        history_aware_retriever = create_retriever(
             llm=model,
-            retriever=retriever,
+            retriever=self.retriever,
             prompt=retriever_prompt
         )
 
@@ -118,24 +206,39 @@ class Assistant:
 
     # Process user input and generate response
     def process_chat(self, question):
+        from langchain_core.messages import HumanMessage, AIMessage
+        from usage import UsageTracker
         start_time = datetime.now()
-        
+
+        # Route locally, and only on predictions confident enough to be trusted; the rest
+        # are answered as "general" questions over all records
+        intent, routing = route(self.knowledge.intent_classifier, question,
+                                self.knowledge.intent_margin, self.knowledge.filter_margin)
+        self.retriever.search_kwargs = {"k": 1, **routing}
+
+        usage = UsageTracker()
         response = self.chain.invoke({
             "input": question,
             "chat_history": self.chat_history,
-            "context": self.context
-        })
+            "intent": intent or "general"
+        }, config={"callbacks": [usage]})
         
         end_time = datetime.now()  # Timestamp after response is generated
 
         # Calculate response time
         response_time = (end_time - start_time).total_seconds()
+
+        # Record how much of the prompt was served from the provider's prompt cache
+        usage_totals.add(usage)
+        logging.info(f"Prompt tokens: {usage.prompt_tokens}, cached: {usage.cached_tokens} "
+                     f"({usage.cached_ratio:.0%}), response time: {response_time:.2f}s")
         
         self.log_to_csv(question, response["answer"], response_time)
         self.log_chat_history(question, response["answer"])
         
         self.chat_history.append(HumanMessage(content=question))
-        main_answer, follow_up = self.split_response(response["answer"])
+        main_answer, model_follow_up = self.split_response(response["answer"])
+        follow_up = self.knowledge.follow_up(response.get("context", [])) or model_follow_up
         
         self.chat_history.append(AIMessage(content=main_answer))
         self.question_count += 1
@@ -161,21 +264,254 @@ class Assistant:
         return main_answer, follow_up
 
 class MapAssistant(Assistant):
-    def __init__(self):
-        super().__init__('prepared_data_ver3.txt', 'map navigation')
+    def __init__(self, knowledge):
+        super().__init__(knowledge, 'map navigation')
+
+# Stored turns ({"question", "answer"} dicts) as chat messages for the chain
+def history_messages(turns):
+    from langchain_core.messages import HumanMessage, AIMessage
+    messages = []
+    for turn in turns:
+        messages += [HumanMessage(content=turn["question"]), AIMessage(content=turn["answer"])]
+    return messages
+
+# Answer one message with a fresh assistant over the current knowledge index
+def answer_message(user_message, chat_history=(), knowledge=None):
+    if knowledge is None:
+        knowledge = reloader.current if reloader else None  # One snapshot for the whole request, even if a reload lands mid-way
+    if knowledge is None:
+        raise RuntimeError("Knowledge index is not loaded")
+    assistant = MapAssistant(knowledge)
+    assistant.chat_history = list(chat_history)
+    return assistant.process_chat(user_message)
+
+# Startup stages, run in the background after the module has imported
+def load_libraries():
+    # Everything the chain needs, so the first request doesn't pay for the imports
+    import langchain.chains
+    import langchain_openai
+    import prompts
+    import retrieval
+    import followups
+    import sharedindex
+    import usage
+
+def load_knowledge():
+    global reloader
+    from reloader import KnowledgeReloader
+    # The knowledge file is watched and rebuilt in the background when it changes;
+    # if this first build fails the watcher keeps retrying and /readyz stays 503
+    reloader = KnowledgeReloader(
+        KNOWLEDGE_FILE, build_knowledge,
+        interval=float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "5"))
+    )
+    reloader.reload()
+    reloader.start()
+
+def warm_chain():
+    if reloader.current is not None:
+        MapAssistant(reloader.current)
+
+startup = StagedStartup([
+    ("libraries", load_libraries),
+    ("knowledge", load_knowledge),
+    ("chain", warm_chain)
+], started=STARTED)
+
+# Gunicorn pre_fork hook (see gunicorn.conf.py). The master stops watching the
+# knowledge file: only workers serve requests, and a reload here would build
+# (and possibly embed) an index no worker uses
+def before_fork():
+    if reloader is not None:
+        reloader.stop()
+
+# Gunicorn post_fork hook. The preloaded master already built the index; each
+# worker keeps the master's copy (shared copy-on-write), drops the master's
+# HTTP connections and starts its own watcher thread. A worker forked after a
+# reload catches up at its watcher's first poll, and the shared index file
+# means it embeds nothing
+def after_fork():
+    reset_clients()
+    if reloader is not None:
+        reloader.after_fork()
+
+def is_ready():
+    return startup.done.is_set() and reloader is not None and reloader.current is not None
+
+# Reject with 429 (or 503 while starting) and a degraded answer from the canned-response layer
+def overloaded(user_message, retry_after, status=429):
+    response = jsonify({
+        "reply": degraded_answer(user_message),
+        "follow_up": "",
+        "degraded": True
+    })
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
 
 # Define chat endpoint (using POST)
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.get_json()
     user_message = data.get("message", "")
-    assistant = MapAssistant()  # Re-initialise for every request
-    main_response, follow_up = assistant.process_chat(user_message)
+    session_id = data.get("session_id") or request.headers.get("X-Session-Id")
+    if not is_ready():
+        return overloaded(user_message, 5, status=503)
+
+    # One round trip for the session's history and any cached answer to the bare question,
+    # which is only used when there is no history that could change the answer. Keys carry
+    # the knowledge content hash, so an edit to the knowledge file retires every cached answer
+    knowledge = reloader.current
+    cache_key = f"{knowledge.content_hash[:16]}:{request_key(user_message)}"
+    turns, cached = sessions.load(session_id, cache_key)
+    cacheable = False
+    answered = True
+    if cached and not turns:
+        main_response, follow_up = cached["reply"], cached["follow_up"]
+    else:
+        address = request.remote_addr or ""
+        client = f"session:{session_id}" if session_id else address
+        reserved = []
+        for limiter, key in ((rate_limiter, client), (address_limiter, address)):
+            allowed, retry_after = limiter.reserve(key)
+            if not allowed:
+                for earlier, earlier_key in reserved:
+                    earlier.refund(earlier_key)
+                return overloaded(user_message, retry_after)
+            reserved.append((limiter, key))
+
+        # Only the leader of a coalesced question runs this, so only it takes a concurrency
+        # slot and keeps its rate-limit tokens; followers wait on its answer without either
+        called_model = []
+        def ask_model(question, chat_history):
+            if not gate.acquire():
+                raise AdmissionRejected(gate.queue_timeout)
+            def call_model():  # Not reached while the circuit is open
+                called_model.append(True)
+                return answer_message(question, chat_history, knowledge)
+            try:
+                return breaker.call(call_model)
+            finally:
+                gate.release()
+
+        try:
+            chat_history = history_messages(turns)
+            # The circuit breaker fails fast with a canned reply while the upstream is down;
+            # concurrent requests for the same question wait on the first one's answer
+            with profiler.request():  # No-op unless an admin has started a profile
+                main_response, follow_up = coalescer.do(
+                    f"{knowledge.content_hash[:16]}:{request_key(user_message, chat_history)}",
+                    ask_model, user_message, chat_history
+                )
+            cacheable = not turns
+        except AdmissionRejected as e:
+            return overloaded(user_message, e.retry_after)
+        except CircuitOpenError:
+            main_response, follow_up, answered = degraded_answer(user_message), "", False
+        except Exception as e:
+            logging.error(f"Upstream error for '{user_message}': {e}")
+            main_response, follow_up, answered = FALLBACK_REPLY, "", False
+        finally:
+            if not called_model:
+                for limiter, key in reserved:
+                    limiter.refund(key)
+    # One round trip to append the turn and, for fresh model answers, fill the cache. Canned
+    # replies stay out of the history, where they would only confuse the next rewrite
+    if answered:
+        sessions.save(
+            session_id, {"question": user_message, "answer": main_response},
+            cache_key if cacheable else None, {"reply": main_response, "follow_up": follow_up}
+        )
     return jsonify({
         "reply": main_response,
         "follow_up": follow_up
     })
 
+# Define metrics endpoint
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "coalescing": coalescer.stats(),
+        "admission": gate.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "address_rate_limit": address_limiter.stats(),
+        "circuit_breaker": breaker.state,
+        "prompt_cache": usage_totals.stats(),
+        "knowledge": knowledge_status(),
+        "startup": startup.status(),
+        "session_store": sessions.stats()
+    })
+
+def knowledge_status():
+    if reloader is None:
+        return {"version": 0}
+    current = reloader.current
+    return dict(
+        reloader.stats(),
+        records=len(current.records) if current else 0,
+        embedded_last_build=current.embedded if current else 0
+    )
+
+# Liveness: the process is up and serving, whatever stage startup is in
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+# Readiness: 200 once the knowledge index is loaded and /chat can answer
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    ready = is_ready()
+    return jsonify(dict(startup.status(), ready=ready, knowledge_version=reloader.version if reloader else 0)), (200 if ready else 503)
+
+# Admin endpoints answer 404 unless ADMIN_TOKEN is set and sent as a bearer token
+def admin_only(view):
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not ADMIN_TOKEN or not hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+            return jsonify({"error": "Not found"}), 404
+        return view(*args, **kwargs)
+    return wrapped
+
+# Start sampling every thread while a /chat request is in flight, for ?seconds=T or the next ?requests=N (per worker process)
+@app.route("/admin/profile", methods=["POST"])
+@admin_only
+def start_profile():
+    seconds = request.args.get("seconds", type=float)
+    requests_to_profile = request.args.get("requests", type=int)
+    interval = request.args.get("interval_ms", default=5, type=float) / 1000
+    try:
+        session = profiler.start(seconds=seconds, requests=requests_to_profile, interval=interval)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(session.status()), 202
+
+# Collapsed stacks (flamegraph.pl / speedscope format) once the profile has finished
+@app.route("/admin/profile", methods=["GET"])
+@admin_only
+def get_profile():
+    session = profiler.session
+    if session is None:
+        return jsonify({"error": "No profile has been started"}), 404
+    if not session.done:
+        return jsonify(session.status()), 202
+    response = app.response_class(session.collapsed(), mimetype="text/plain")
+    response.headers["X-Profile-Samples"] = str(session.samples)
+    return response
+
+# tracemalloc and object-count snapshot; each call reports growth since the previous one
+@app.route("/admin/memory", methods=["POST"])
+@admin_only
+def memory_snapshot():
+    return jsonify(memory_diagnostics.take(limit=request.args.get("limit", default=25, type=int)))
+
+# Stop tracing allocations again
+@app.route("/admin/memory", methods=["DELETE"])
+@admin_only
+def stop_memory_tracing():
+    memory_diagnostics.stop()
+    return jsonify({"tracing": False})
+
 # Define log download endpoint
 @app.route("/download_logs", methods=["GET"])
 def download_logs():
@@ -191,6 +527,9 @@ def download_logs_txt():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Slow startup stages run in the background; STARTUP_BACKGROUND=0 runs them before serving
+startup.start(background=os.getenv("STARTUP_BACKGROUND", "1") != "0")
+
 # Run the Flask app
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,60 @@
+# Follow-up suggestions per knowledge record, computed when the index is built
+# instead of asking the model to invent one on every turn. Each record's
+# suggestions are the most similar other records by embedding, with a bonus for
+# sharing its category (the label set used by the files in input files/), skipping
+# records that would give the same answer.
+#
+#   python followups.py   # print the suggestions for review
+import numpy as np
+
+FOLLOW_UP_PREFIX = "Would you like to know more about:"
+CATEGORY_WEIGHT = 0.2  # Added to the cosine similarity of records in the same category
+PER_RECORD = 1  # The app attaches one suggestion per answer
+
+
+# Short topic for a record: the first of its keyword phrases
+def topic(record):
+    return record["keywords"].split(",")[0].strip()
+
+
+def compute_followups(records, vectors, per_record=PER_RECORD, category_weight=CATEGORY_WEIGHT):
+    """Indexes of up to ``per_record`` suggested records for every record."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scores = vectors @ vectors.T
+    categories = np.array([record["category"] for record in records])
+    scores += category_weight * (categories[:, None] == categories[None, :])
+
+    followups = []
+    for i, record in enumerate(records):
+        chosen = []
+        seen = {record["response"].strip(), topic(record).lower()}
+        for j in np.argsort(-scores[i]):
+            candidate = records[j]
+            if j == i or candidate["response"].strip() in seen or topic(candidate).lower() in seen:
+                continue
+            chosen.append(int(j))
+            seen.update((candidate["response"].strip(), topic(candidate).lower()))
+            if len(chosen) == per_record:
+                break
+        followups.append(chosen)
+    return followups
+
+
+def follow_up_text(records, suggestions):
+    if not suggestions:
+        return ""
+    return f"{FOLLOW_UP_PREFIX} {topic(records[suggestions[0]])}?"
+
+
+if __name__ == "__main__":
+    from knowledge import load_records, to_documents
+    from llm import get_embeddings
+    from sharedindex import SharedVectorIndex
+
+    records = load_records("prepared_data_ver3.txt")
+    index = SharedVectorIndex.load_or_build(to_documents(records), get_embeddings())
+    followups = index.sidecar("followups", lambda: compute_followups(records, index.vectors))
+    for record, suggestions in zip(records, followups):
+        print(f"{record['category']} / {topic(record)}")
+        for j in suggestions:
+            print(f"    -> {records[j]['category']} / {topic(records[j])}")
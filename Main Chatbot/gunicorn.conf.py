@@ -0,0 +1,37 @@
+# Gunicorn settings for the chatbot:
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# The app is preloaded in the master, which imports the heavy libraries, builds
+# the knowledge index and writes the shared index file once. Workers forked
+# from it reuse that index, sharing its pages copy-on-write and mapping the
+# index file read-only (see sharedindex.py), so adding workers adds little
+# memory. Each worker watches the knowledge file; the master stops watching.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+# Run the startup stages in the master before forking, not in a background
+# thread, which would not survive the fork
+if preload_app:
+    os.environ.setdefault("STARTUP_BACKGROUND", "0")
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        import app
+        app.before_fork()
+    # Move everything allocated so far out of the collector's reach, so garbage
+    # collections in the workers don't write to (and so copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        import app
+        app.after_fork()
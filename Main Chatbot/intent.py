@@ -0,0 +1,226 @@
+# Local intent classifier: picks the knowledge category for a question
+# without calling the LLM. TF-IDF over word unigrams and bigrams with one
+# L2-normalised centroid per category (nearest-centroid / Rocchio).
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from knowledge import load_records
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_DIR = os.path.join(os.path.dirname(BASE_DIR), "input files")
+PREPARED_DIR = os.path.join(os.path.dirname(BASE_DIR), "prepared")  # Output of prepare.py run from the repo root
+SIDECAR_COLUMNS = ["label", "keywords", "response"]
+# The columnar sidecar prepare.py writes for the training split, or the text file when there is none
+TRAIN_SIDECAR = os.path.join(PREPARED_DIR, "train.cols")
+TRAIN_FILES = [TRAIN_SIDECAR if os.path.isdir(TRAIN_SIDECAR) else os.path.join(INPUT_DIR, "train_data.txt")]
+VALIDATION_FILE = os.path.join(INPUT_DIR, "validation_data.txt")
+TEST_FILE = os.path.join(INPUT_DIR, "test_data.txt")
+ROUTE_PRECISION = 0.75  # Predictions used at all (prompt label, retrieval boost) must be this precise
+FILTER_PRECISION = 0.9  # Predictions trusted to restrict retrieval must be this precise
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "are", "was", "be", "by",
+    "with", "at", "as", "it", "this", "that", "i", "you", "your", "me", "my", "can", "do", "does",
+    "how", "what", "where", "which", "who", "find", "about", "please", "then", "there", "if",
+}
+
+
+# Records from a prepare.py sidecar directory: each column is a uint8 .npy of
+# concatenated UTF-8 values plus an int64 .offsets.npy, both memory-mapped
+def load_sidecar(sidecar_dir):
+    columns = []
+    for name in SIDECAR_COLUMNS:
+        data = np.load(os.path.join(sidecar_dir, f"{name}.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(sidecar_dir, f"{name}.offsets.npy"), mmap_mode="r").tolist()
+        columns.append([data[start:end].tobytes().decode("utf-8") for start, end in zip(offsets, offsets[1:])])
+    return [{"category": label, "keywords": keywords, "response": response}
+            for label, keywords, response in zip(*columns)]
+
+
+# Labelled records from a knowledge-format text file or a prepared sidecar directory
+def load_examples(path):
+    return load_sidecar(path) if os.path.isdir(path) else load_records(path)
+
+
+# Lower-case word tokens plus adjacent-word bigrams
+def tokenize(text):
+    words = [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    def __init__(self, min_score=0.1):
+        self.min_score = min_score  # Below this cosine score the question is left unclassified
+        self.idf = {}
+        self.postings = {}  # term -> [(category, centroid weight)]
+        self.categories = []
+
+    # Weighted, L2-normalised TF-IDF vector for a text
+    def vectorize(self, text):
+        counts = Counter(t for t in tokenize(text) if t in self.idf)
+        vector = {t: (1 + math.log(c)) * self.idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    # Train from (category, text) pairs
+    def fit(self, examples):
+        examples = list(examples)
+        df = Counter()
+        for _, text in examples:
+            df.update(set(tokenize(text)))
+        n = len(examples)
+        self.idf = {t: math.log((1 + n) / (1 + c)) + 1 for t, c in df.items()}
+
+        centroids = defaultdict(Counter)
+        for category, text in examples:
+            centroids[category].update(self.vectorize(text))
+        self.categories = sorted(centroids)
+
+        postings = defaultdict(list)
+        for category, centroid in centroids.items():
+            norm = math.sqrt(sum(w * w for w in centroid.values())) or 1.0
+            for term, weight in centroid.items():
+                postings[term].append((category, weight / norm))
+        self.postings = dict(postings)
+        return self
+
+    # Return (category, score) pairs, best first
+    def scores(self, text):
+        totals = defaultdict(float)
+        for term, weight in self.vectorize(text).items():
+            for category, centroid_weight in self.postings.get(term, ()):
+                totals[category] += weight * centroid_weight
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    # Best category for a question, or None when nothing scores above min_score
+    def predict(self, text):
+        ranked = self.scores(text)
+        if not ranked or ranked[0][1] < self.min_score:
+            return None
+        return ranked[0][0]
+
+    # Best category and its margin over the runner-up, the confidence used for routing
+    def confidence(self, text):
+        ranked = self.scores(text)
+        if not ranked or ranked[0][1] < self.min_score:
+            return None, 0.0
+        return ranked[0][0], ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0.0)
+
+    @classmethod
+    def from_files(cls, file_paths, **kwargs):
+        examples = []
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                continue
+            for record in load_examples(file_path):
+                examples.append((record["category"], f"{record['keywords']} {record['response']}"))
+        return cls(**kwargs).fit(examples)
+
+
+# Keywords of every example in the given files, to keep seen examples out of evaluation
+def seen_keywords(file_paths):
+    return {record["keywords"].lower() for path in file_paths if os.path.exists(path) for record in load_examples(path)}
+
+
+# Records of a labelled split that were not among the training examples
+def held_out(file_path, exclude=()):
+    return [record for record in load_records(file_path) if record["keywords"].lower() not in exclude]
+
+
+# Accuracy and per-query latency on the held-out part of a labelled split
+def evaluate(classifier, file_path, exclude=()):
+    records = held_out(file_path, exclude)
+    correct = 0
+    latencies = []
+    for record in records:
+        start = time.perf_counter()
+        predicted = classifier.predict(record["keywords"])
+        latencies.append(time.perf_counter() - start)
+        correct += predicted == record["category"]
+    latencies.sort()
+    return {
+        "examples": len(records),
+        "excluded": len(load_records(file_path)) - len(records),
+        "accuracy": correct / len(records) if records else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+# Smallest margin at which held-out predictions reach ``target_precision``, with
+# the coverage it leaves; None when no margin gets there and nothing should be filtered
+def calibrate(classifier, file_path, exclude=(), target_precision=FILTER_PRECISION, min_examples=5):
+    predictions = []
+    for record in held_out(file_path, exclude):
+        category, margin = classifier.confidence(record["keywords"])
+        if category is not None:
+            predictions.append((margin, category == record["category"]))
+    predictions.sort(reverse=True)
+    best = None
+    correct = 0
+    for n, (margin, right) in enumerate(predictions, 1):
+        correct += right
+        if n >= min_examples and correct / n >= target_precision:
+            best = (margin, n / len(predictions))
+    return best
+
+
+# Margins above which a classifier trained on ``train_files`` is used for routing and
+# trusted to filter, calibrated on the held-out validation split; None where never,
+# or when the split is not deployed alongside the app
+def routing_margins(classifier, train_files):
+    if not os.path.exists(VALIDATION_FILE):
+        return None, None
+    exclude = seen_keywords(train_files)
+    margins = []
+    for precision in (ROUTE_PRECISION, FILTER_PRECISION):
+        calibration = calibrate(classifier, VALIDATION_FILE, exclude, precision)
+        margins.append(calibration[0] if calibration else None)
+    return tuple(margins)
+
+
+def route(classifier, question, margin, filter_margin=None):
+    """Predicted category and the retrieval kwargs to add for it.
+
+    Below ``margin`` (or with no margin at all) the prediction is not trusted:
+    the category is None, so the prompt says "general" and retrieval is left
+    alone. From ``filter_margin`` retrieval is restricted to the category;
+    between the two its records are only boosted.
+    """
+    category, confidence = classifier.confidence(question)
+    if category is None or margin is None or confidence < margin:
+        return None, {}
+    if filter_margin is not None and confidence >= filter_margin:
+        return category, {"filter": {"category": category}}
+    return category, {"boost": {"category": category}}
+
+
+if __name__ == "__main__":
+    # Usage: python intent.py [train files...]  - held-out accuracy on the validation and test
+    # splits, and the confidence margins (INTENT_MARGIN, INTENT_FILTER_MARGIN) above which the
+    # predicted category is used for routing and for filtering retrieval. Validation/test examples that also appear in the
+    # training files are left out, so training on the knowledge file can't inflate the numbers
+    train_files = sys.argv[1:] or TRAIN_FILES
+    classifier = IntentClassifier.from_files(train_files)
+    exclude = seen_keywords(train_files)
+    print(f"Categories: {len(classifier.categories)}")
+    for name, path in (("Validation", VALIDATION_FILE), ("Test", TEST_FILE)):
+        report = evaluate(classifier, path, exclude)
+        print(f"{name}: {report['accuracy']:.1%} on {report['examples']} held-out examples "
+              f"({report['excluded']} seen in training left out), "
+              f"latency mean {report['mean_ms']:.3f} ms, p99 {report['p99_ms']:.3f} ms")
+    for setting, precision in (("INTENT_MARGIN", ROUTE_PRECISION), ("INTENT_FILTER_MARGIN", FILTER_PRECISION)):
+        calibration = calibrate(classifier, VALIDATION_FILE, exclude, precision)
+        if calibration is None:
+            print(f"{setting}: no margin reaches {precision:.0%} precision on validation")
+        else:
+            margin, coverage = calibration
+            print(f"{setting}={margin:.3f} reaches {precision:.0%} precision on validation, "
+                  f"covering {coverage:.0%} of questions")
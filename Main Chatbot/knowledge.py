@@ -0,0 +1,56 @@
+# Parse the 'Category : keywords : response' knowledge file into records
+import hashlib
+import os
+
+
+# Stable id for a record from its category and keywords, so editing a response keeps the id
+def record_id(category, keywords):
+    return hashlib.sha1(f"{category}\x1f{keywords}".encode("utf-8")).hexdigest()[:16]
+
+
+# Split a knowledge file into one record per entry; lines without the
+# 'Category : keywords : response' shape continue the previous record
+def load_records(file_path):
+    records = []
+    with open(file_path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(':', 2)
+            if len(parts) == 3:
+                category, keywords, response = (part.strip() for part in parts)
+                records.append({
+                    "category": category,
+                    "keywords": keywords,
+                    "response": response,
+                    "text": line,
+                })
+            elif records:
+                records[-1]["response"] += "\n" + line
+                records[-1]["text"] += "\n" + line
+
+    # Repeated category + keywords pairs are numbered in file order
+    seen = {}
+    for record in records:
+        key = record_id(record["category"], record["keywords"])
+        seen[key] = seen.get(key, 0) + 1
+        record["id"] = key if seen[key] == 1 else f"{key}-{seen[key]}"
+    return records
+
+
+# Wrap records as langchain Documents so each entry is embedded and retrieved on its own
+def to_documents(records, source=None):
+    from langchain_core.documents import Document
+    return [
+        Document(
+            page_content=record["text"],
+            metadata={
+                "id": record["id"],
+                "category": record["category"],
+                "keywords": record["keywords"],
+                "source": os.path.basename(source) if source else "",
+            },
+        )
+        for record in records
+    ]
@@ -0,0 +1,197 @@
+# Process-wide OpenAI clients: one pooled HTTP connection pool, per-call
+# timeouts, bounded retries with jitter and a circuit breaker with a canned reply.
+# httpx and langchain_openai are imported on first use, so importing this
+# module stays cheap for the app's startup path.
+import os
+import threading
+import time
+
+# Point OPENAI_BASE_URL at a local stand-in (see stub_openai.py) for testing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))  # Seconds per upstream call
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))  # Retries after the first attempt
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+# Reply served while the upstream is failing or the circuit is open
+FALLBACK_REPLY = (
+    "Sorry, I'm having trouble answering right now. Please try again in a moment. "
+    "In the meantime, you can search for your theme of interest in the search box on the right-hand side pane of the Atlas map."
+)
+
+_lock = threading.RLock()
+_http_client = None
+_chat_models = {}
+_embeddings = None
+
+
+# Shared keep-alive connection pool so TLS connections are reused across requests
+def get_http_client():
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            )
+        return _http_client
+
+
+# Connection failures, timeouts, 429s and 5xx responses: worth a retry and a sign the
+# upstream is in trouble. Other 4xx responses (bad request, auth) and local errors are neither
+def upstream_errors():
+    import openai
+    return openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError  # Timeouts are connection errors
+
+
+def is_upstream_failure(error):
+    return isinstance(error, upstream_errors())
+
+
+# Chat model with bounded, jittered retries; one instance per (model, temperature)
+def get_chat_model(model="gpt-4o-mini", temperature=0.5):
+    key = (model, temperature)
+    with _lock:
+        if key not in _chat_models:
+            from langchain_openai import ChatOpenAI
+            chat_model = ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=OPENAI_BASE_URL,
+                timeout=LLM_TIMEOUT,
+                max_retries=0,  # Retries are handled by with_retry below
+                http_client=get_http_client(),
+            )
+            _chat_models[key] = chat_model.with_retry(
+                retry_if_exception_type=upstream_errors(),
+                stop_after_attempt=LLM_MAX_RETRIES + 1,
+                wait_exponential_jitter=True,
+            )
+        return _chat_models[key]
+
+
+# Embeddings client sharing the same connection pool
+def get_embeddings():
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            _embeddings = OpenAIEmbeddings(
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=OPENAI_BASE_URL,
+                timeout=LLM_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES,
+                http_client=get_http_client(),
+                # Stand-in servers expect plain text rather than pre-tokenised input
+                check_embedding_ctx_length=OPENAI_BASE_URL is None,
+            )
+        return _embeddings
+
+
+# Forget the clients after a fork: a child must not share the parent's
+# keep-alive sockets or a lock the parent might have held while forking
+def reset_clients():
+    global _lock, _http_client, _chat_models, _embeddings
+    _lock = threading.RLock()
+    _http_client = None
+    _chat_models = {}
+    _embeddings = None
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling a failing upstream so requests can fail fast.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    every call raises CircuitOpenError until ``reset_timeout`` seconds have
+    passed. Then a single trial call is let through (half-open): success
+    closes the circuit, failure opens it again.
+
+    Only exceptions for which ``is_failure`` returns True count; others are
+    raised without touching the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, is_failure=lambda error: True):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def call(self, fn, *args, **kwargs):
+        with self.lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self.trial_running):
+                raise CircuitOpenError("upstream circuit is open")
+            if state == "half-open":
+                self.trial_running = True
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            with self.lock:
+                self.trial_running = False
+                if self.is_failure(e):
+                    self.failures += 1
+                    if state == "half-open" or self.failures >= self.failure_threshold:
+                        self.opened_at = time.monotonic()
+            raise
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+        return result
+
+
+# One breaker for the whole process, shared by every request
+breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    is_failure=is_upstream_failure,
+)
+
+
+class UsageTotals:
+    """Process-wide prompt cache statistics for /metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def add(self, tracker):
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += tracker.prompt_tokens
+            self.cached_tokens += tracker.cached_tokens
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+
+usage_totals = UsageTotals()
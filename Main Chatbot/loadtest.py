@@ -0,0 +1,277 @@
+# Load test for the chatbot's HTTP endpoints. Run the app against
+# stub_openai.py so no real OpenAI calls are made, either by hand:
+#
+#   python stub_openai.py --port 8001 --latency-ms 500 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python app.py &
+#   python loadtest.py --url http://127.0.0.1:5000/chat --concurrency 50 --requests 500
+#
+# or let the suite start both, drive a target rate and save a JSON baseline:
+#
+#   python loadtest.py --spawn --rps 20 --duration 30 --mix chat=8,download_logs=1,download_logs_txt=1 \
+#       --chat-latency lognormal:800,0.5 --unique-questions --out baseline.json --compare previous.json
+#
+# The questions repeat, so after the first few requests most chats are answer
+# cache hits; --unique-questions numbers every question so each one misses the
+# cache and exercises retrieval and the model, which is what a baseline of the
+# chat path should measure.
+#
+# With --rps the load is open-loop: requests are sent on schedule whether or not
+# earlier ones have finished, and latency is measured from the scheduled send
+# time, so a backed-up server shows up in the percentiles instead of slowing
+# the test down.
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+QUESTIONS = [
+    "how do I find latest data",
+    "assault",
+    "how are results calculated",
+    "where is the calendar icon",
+    "how do I download a table",
+    "what themes are there",
+]
+
+ENDPOINTS = {
+    "chat": ("POST", "/chat"),
+    "download_logs": ("GET", "/download_logs"),
+    "download_logs_txt": ("GET", "/download_logs_txt"),
+}
+
+
+def send(url, question, client, method="POST"):
+    body = json.dumps({"message": question}).encode("utf-8") if method == "POST" else None
+    # Each simulated visitor gets its own address so per-client rate limits apply per visitor. The
+    # app trusts the last X-Forwarded-For hop, so this only takes effect when the load test talks
+    # to the app directly and stands in for the hosting proxy; behind a real proxy it is ignored
+    headers = {"Content-Type": "application/json", "X-Forwarded-For": client}
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, body, headers, method=method), timeout=120) as response:
+            status = response.status
+            response.read()
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = "error"
+    return status, time.perf_counter() - start
+
+
+def question(i, unique):
+    text = QUESTIONS[i % len(QUESTIONS)]
+    return f"{text} {i}" if unique else text
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def client_address(i, clients):
+    return f"10.0.{i % clients // 256}.{i % clients % 256}"
+
+
+def run(url, concurrency, total, clients, unique=False):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda i: send(url, question(i, unique), client_address(i, clients)),
+            range(total)
+        ))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _ in results)
+    ok = [latency for status, latency in results if status == 200]
+    all_latencies = [latency for _, latency in results]
+    print(f"{total} requests, concurrency {concurrency}, {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"Status codes: {dict(statuses)}")
+    for name, latencies in (("all", all_latencies), ("200 only", ok)):
+        print(f"Latency {name}: p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.0f} ms, max {max(latencies, default=0) * 1000:.0f} ms")
+
+
+# Endpoint names repeated by weight, e.g. "chat=8,download_logs=1" -> 8 x chat, 1 x download_logs
+def parse_mix(spec):
+    schedule = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}, expected one of {sorted(ENDPOINTS)}")
+        schedule += [name] * int(weight or 1)
+    return schedule
+
+
+def summarize(results, elapsed):
+    summary = {}
+    by_endpoint = defaultdict(list)
+    for name, status, latency in results:
+        by_endpoint[name].append((status, latency))
+    by_endpoint["overall"] = [(status, latency) for _, status, latency in results]
+    for name, rows in by_endpoint.items():
+        latencies = [latency for _, latency in rows]
+        statuses = Counter(str(status) for status, _ in rows)
+        # 429/503 are deliberate load shedding, counted apart from failures
+        rejected = sum(statuses.get(code, 0) for code in ("429", "503"))
+        errors = sum(count for code, count in statuses.items() if not code.startswith("2") and code not in ("429", "503"))
+        count = len(rows) or 1  # No requests at all: every rate is 0
+        summary[name] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / count, 4),
+            "rejected_rate": round(rejected / count, 4),
+            "status_codes": dict(statuses),
+            "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 90, 95, 99)},
+        }
+        summary[name]["latency_ms"]["max"] = round(max(latencies, default=0.0) * 1000, 1)
+    return summary
+
+
+def run_rate(base_url, rps, duration, mix, clients, max_in_flight, unique=False):
+    schedule = parse_mix(mix)
+    total = int(rps * duration)
+    results = []
+    lock = threading.Lock()
+
+    def fire(i, scheduled):
+        name = schedule[i % len(schedule)]
+        method, path = ENDPOINTS[name]
+        status, _ = send(base_url + path, question(i, unique), client_address(i, clients), method)
+        latency = time.perf_counter() - scheduled  # Includes any time spent waiting for a free sender
+        with lock:
+            results.append((name, status, latency))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, i, scheduled)
+    elapsed = time.perf_counter() - start
+    return summarize(results, elapsed), elapsed
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/readyz", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{base_url} was not ready within {timeout:.0f}s")
+
+
+# Start the stub upstream and the app as child processes; returns them for shutdown
+def spawn(args, base_url):
+    here = os.path.dirname(os.path.abspath(__file__))
+    stub_command = [sys.executable, "stub_openai.py", "--port", str(args.stub_port),
+                    "--chat-latency", args.chat_latency, "--error-rate", str(args.error_rate)]
+    if args.embed_latency:
+        stub_command += ["--embed-latency", args.embed_latency]
+    env = dict(os.environ, OPENAI_BASE_URL=f"http://127.0.0.1:{args.stub_port}/v1", OPENAI_API_KEY="stub")
+    port = urlsplit(base_url).port
+    if args.server == "gunicorn":
+        app_command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "app:app"]
+    else:
+        app_command = [sys.executable, "-c", f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    processes = []
+    for command in (stub_command, app_command):
+        processes.append(subprocess.Popen(command, cwd=here, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return processes
+
+
+def compare(summary, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["endpoints"]
+    print(f"\nAgainst {baseline_path}:")
+    for name, current in summary.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for metric in ("p50", "p99"):
+            old, new = before["latency_ms"][metric], current["latency_ms"][metric]
+            change = f"{(new - old) / old:+.0%}" if old else "n/a"
+            print(f"  {name:<18} {metric}: {old:8.1f} -> {new:8.1f} ms ({change})")
+        print(f"  {name:<18} error rate: {before['error_rate']:.2%} -> {current['error_rate']:.2%}")
+
+
+def run_suite(args):
+    base_url = f"{urlsplit(args.url).scheme}://{urlsplit(args.url).netloc}"
+    processes = spawn(args, base_url) if args.spawn else []
+    try:
+        wait_ready(base_url, args.ready_timeout)
+        summary, elapsed = run_rate(base_url, args.rps, args.duration, args.mix, args.clients, args.max_in_flight,
+                                    args.unique_questions)
+    finally:
+        for process in reversed(processes):
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+
+    print(f"{args.rps} req/s target for {args.duration}s, achieved over {elapsed:.1f}s")
+    for name, stats in summary.items():
+        latency = stats["latency_ms"]
+        print(f"{name:<18} {stats['requests']:>6} req  {stats['throughput_rps']:>7.2f} req/s  "
+              f"errors {stats['error_rate']:.2%}  rejected {stats['rejected_rate']:.2%}  "
+              f"p50 {latency['p50']:.0f}  p90 {latency['p90']:.0f}  p99 {latency['p99']:.0f}  max {latency['max']:.0f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "host": platform.node(),
+                "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+                "elapsed_seconds": round(elapsed, 2),
+                "endpoints": summary,
+            }, f, indent=2)
+        print(f"Saved baseline to {args.out}")
+    if args.compare:
+        compare(summary, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the chatbot's HTTP endpoints")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/chat")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=100, help="distinct simulated client addresses")
+    parser.add_argument("--unique-questions", action="store_true",
+                        help="number every question so no chat is served from the answer cache")
+    # Open-loop suite
+    parser.add_argument("--rps", type=float, help="target request rate; switches to the open-loop suite")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load at --rps")
+    parser.add_argument("--mix", default="chat=1", help="weighted endpoints, e.g. chat=8,download_logs=1")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="most requests outstanding at once")
+    parser.add_argument("--out", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare the results against")
+    parser.add_argument("--spawn", action="store_true", help="start stub_openai.py and the app for the run")
+    parser.add_argument("--server", choices=["flask", "gunicorn"], default="flask", help="how --spawn runs the app")
+    parser.add_argument("--stub-port", type=int, default=8001)
+    parser.add_argument("--chat-latency", default="constant:500", help="stub chat latency spec (see stub_openai.py)")
+    parser.add_argument("--embed-latency", help="stub embedding latency spec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub upstream failure rate")
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    args = parser.parse_args()
+    if args.rps is not None and int(args.rps * args.duration) < 1:
+        parser.error(f"--rps {args.rps:g} for --duration {args.duration:g}s schedules no requests")
+    if args.rps:
+        run_suite(args)
+    else:
+        run(args.url, args.concurrency, args.requests, args.clients, args.unique_questions)
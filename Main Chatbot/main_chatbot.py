@@ -1,13 +1,12 @@
 import os
 from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import Chroma
 from langchain.chains import create_retrieval_chain
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
 
 import csv
 import logging
@@ -35,18 +34,14 @@ class Assistant:
     def __init__(self, file_path, context):
         self.context = context
         self.docs = self.load_text(file_path)
-        self.vectorStore = self.create_db(self.docs)
         self.chain = self.create_chain()
         self.chat_history = []
         self.is_new_user = False
 
+    # The whole file is one document, so every question gets all of it as context
     def load_text(self, file_path):
-        loader = TextLoader(file_path, encoding='utf-8')
-        return loader.load()
-
-    def create_db(self, docs):
-        embedding = OpenAIEmbeddings(openai_api_key=constants.APIKEY)
-        return Chroma.from_documents(docs, embedding=embedding)
+        with open(file_path, encoding='utf-8') as f:
+            return [Document(page_content=f.read(), metadata={"source": file_path})]
 
     def create_chain(self):
         model = ChatOpenAI(
@@ -78,22 +73,12 @@ class Assistant:
             prompt=prompt
         )
 
-        retriever = self.vectorStore.as_retriever(search_kwargs={"k": 1})
-
-        retriever_prompt = ChatPromptTemplate.from_messages([
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            ("human", f"Given the above conversation about {self.context}, generate a search query to look up relevant information")
-        ])
-
-        history_aware_retriever = create_history_aware_retriever(
-            llm=model,
-            retriever=retriever,
-            prompt=retriever_prompt
-        )
+        # With a single document there is nothing to search, so no embeddings and
+        # no model call to rewrite the question into a search query
+        retriever = RunnableLambda(lambda _: self.docs)
 
         return create_retrieval_chain(
-            history_aware_retriever,
+            retriever,
             chain
         )
 
@@ -0,0 +1,104 @@
+# Memory of a gunicorn deployment with and without preloading, read from
+# /proc/<pid>/smaps_rollup (Linux only). Rss counts shared pages once in
+# every process; Pss splits them between the processes sharing them, so the
+# Pss total is what the machine actually spends. Run against the stub, e.g.
+#
+#   python stub_openai.py --port 8001 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python memreport.py --workers 1 4 8
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def memory_kb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return found
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def post(url, message):
+    request = urllib.request.Request(url, json.dumps({"message": message}).encode("utf-8"),
+                                     {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+    except OSError:
+        pass
+
+
+def measure(workers, preload, port, timeout):
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0", KNOWLEDGE_RELOAD_INTERVAL="0")
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+         "-b", f"127.0.0.1:{port}", "app:app"],
+        cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        # Ready when several readiness checks in a row succeed, so every worker has loaded
+        deadline = time.monotonic() + timeout
+        streak = 0
+        while streak < workers * 3 and time.monotonic() < deadline:
+            streak = streak + 1 if get(f"http://127.0.0.1:{port}/readyz") == 200 else 0
+            time.sleep(0.05 if streak else 0.5)
+        for i in range(workers * 4):  # Exercise each worker's request path
+            post(f"http://127.0.0.1:{port}/chat", f"how do I find data on theme {i}")
+        time.sleep(1)
+        master_memory = memory_kb(master.pid)
+        worker_memory = [memory_kb(pid) for pid in children(master.pid)]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+    return master_memory, worker_memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker and total memory of the gunicorn deployment")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--timeout", type=float, default=180, help="seconds to wait for every worker to be ready")
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'workers':>7} {'worker RSS':>11} {'worker PSS':>11} {'total RSS':>10} {'total PSS':>10}  (MB)")
+    for preload in (False, True):
+        for workers in args.workers:
+            master_memory, worker_memory = measure(workers, preload, args.port, args.timeout)
+            everything = [master_memory] + worker_memory
+            print(f"{'preload' if preload else 'no preload':>10} {len(worker_memory):>7} "
+                  f"{sum(m['Rss'] for m in worker_memory) / len(worker_memory) / 1024:>11.1f} "
+                  f"{sum(m['Pss'] for m in worker_memory) / len(worker_memory) / 1024:>11.1f} "
+                  f"{sum(m['Rss'] for m in everything) / 1024:>10.1f} "
+                  f"{sum(m['Pss'] for m in everything) / 1024:>10.1f}")
@@ -0,0 +1,159 @@
+# On-demand diagnostics for the admin endpoints: a sampling CPU profiler that
+# writes collapsed stacks (the input format of flamegraph.pl and speedscope)
+# and tracemalloc / object-count snapshots diffed against the previous one.
+# Nothing runs until an admin starts it; while idle the only cost on the request
+# path is one attribute check.
+import gc
+import linecache
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfileSession:
+    def __init__(self, seconds=None, requests=None, interval=0.005):
+        self.seconds = seconds
+        self.requests = requests
+        self.interval = interval
+        self.started = time.monotonic()
+        self.finished = None
+        self.completed_requests = 0
+        self.samples = 0
+        self.stacks = Counter()
+        self.threads = set()  # Threads currently handling a profiled request; sampling runs while any are
+        self.lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        return {
+            "running": not self.done,
+            "seconds": self.seconds,
+            "requests": self.requests,
+            "completed_requests": self.completed_requests,
+            "samples": self.samples,
+            "elapsed_seconds": round((self.finished or time.monotonic()) - self.started, 3),
+        }
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread from a background thread while a
+    profiled request is in flight.
+
+    Requests hand work to executor threads (the chain's runnables, speculative
+    retrieval), so sampling only the request thread would show it waiting.
+
+    A session ends after ``seconds`` or after ``requests`` profiled requests
+    complete, whichever is set (and comes first).
+    """
+
+    def __init__(self):
+        self.session = None
+
+    def start(self, seconds=None, requests=None, interval=0.005):
+        if self.session is not None and not self.session.done:
+            raise RuntimeError("A profile is already running")
+        if seconds is None and requests is None:
+            seconds = 10
+        session = self.session = ProfileSession(seconds, requests, interval)
+        threading.Thread(target=self._sample, args=(session,), name="profiler", daemon=True).start()
+        return session
+
+    def _sample(self, session):
+        while not session.done:
+            if session.seconds is not None and time.monotonic() - session.started >= session.seconds:
+                session.finished = time.monotonic()
+                break
+            frames = sys._current_frames()
+            frames.pop(threading.get_ident(), None)  # Not the profiler itself
+            with session.lock:
+                if session.threads:
+                    for frame in frames.values():
+                        session.stacks[_collapse(frame)] += 1
+                        session.samples += 1
+            time.sleep(session.interval)
+
+    # Wrap a request so its thread is sampled while a session is running
+    @contextmanager
+    def request(self):
+        session = self.session
+        if session is None or session.done:
+            yield
+            return
+        thread_id = threading.get_ident()
+        with session.lock:
+            session.threads.add(thread_id)
+        try:
+            yield
+        finally:
+            with session.lock:
+                session.threads.discard(thread_id)
+                session.completed_requests += 1
+                if session.requests is not None and session.completed_requests >= session.requests:
+                    session.finished = time.monotonic()
+
+
+class MemoryDiagnostics:
+    """tracemalloc and live-object snapshots, each diffed against the previous one."""
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.snapshot = None
+        self.type_counts = None
+
+    def take(self, limit=25):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)  # Only allocations from now on are traced
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, __file__),  # The previous snapshot's own bookkeeping
+        ])
+        type_counts = Counter(type(o).__name__ for o in gc.get_objects())
+
+        report = {
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "peak_traced_bytes": tracemalloc.get_traced_memory()[1],
+            "baseline": self.snapshot is None,
+        }
+        if self.snapshot is not None:
+            report["growth_by_line"] = [
+                {
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in snapshot.compare_to(self.snapshot, "traceback")[:limit]
+                if stat.size_diff > 0
+            ]
+            type_growth = Counter(type_counts)
+            type_growth.subtract(self.type_counts)
+            report["growth_by_type"] = dict(
+                (name, diff) for name, diff in type_growth.most_common(limit) if diff > 0
+            )
+        else:
+            report["top_types"] = dict(type_counts.most_common(limit))
+        self.snapshot, self.type_counts = snapshot, type_counts
+        return report
+
+    def stop(self):
+        tracemalloc.stop()
+        self.snapshot = self.type_counts = None
@@ -0,0 +1,109 @@
+# Hot reload of the knowledge file: a watcher thread notices changes, builds
+# the new index in the background and swaps it in with a single reference
+# assignment. Requests take one snapshot when they start, so in-flight
+# requests finish on the index they began with.
+import hashlib
+import logging
+import os
+import threading
+import time
+
+
+class KnowledgeReloader:
+    """Keeps the current index built by ``build(file_path, version)`` in step with the file.
+
+    ``current`` is whatever ``build`` returned for the latest successful load
+    (None until the first one). A failed build leaves the previous index in
+    place and is retried at the next poll.
+    """
+
+    def __init__(self, file_path, build, interval=5.0):
+        self.file_path = file_path
+        self.build = build
+        self.interval = interval
+        self.current = None
+        self.lock = threading.Lock()  # One build at a time
+        self.version = 0
+        self.content_hash = None
+        self.loaded_at = None
+        self.build_seconds = None
+        self.failed = 0
+        self.last_error = None
+        self._stat = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def _file_stat(self):
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    # Build and swap in the file's current contents; returns True if a new index was loaded
+    def reload(self, force=False):
+        with self.lock:
+            try:
+                stat = self._file_stat()
+                with open(self.file_path, "rb") as f:
+                    content_hash = hashlib.sha1(f.read()).hexdigest()
+                if content_hash == self.content_hash and not force:
+                    self._stat = stat  # Touched but unchanged
+                    return False
+
+                start = time.perf_counter()
+                index = self.build(self.file_path, self.version + 1)
+                self.build_seconds = time.perf_counter() - start
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+                logging.error(f"Knowledge reload of {self.file_path} failed: {e}")
+                return False
+
+            self.current = index  # Atomic swap: new requests see the new index from here on
+            self.version += 1
+            self.content_hash = content_hash
+            self.loaded_at = time.time()
+            self.last_error = None
+            self._stat = stat
+            logging.info(f"Loaded knowledge version {self.version} ({content_hash[:12]}) "
+                         f"in {self.build_seconds:.2f}s")
+            return True
+
+    def _watch(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                changed = self._file_stat() != self._stat
+            except OSError:
+                continue  # Mid-replace; look again next time
+            if changed:
+                self.reload()
+
+    def start(self):
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="knowledge-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    # Stop the watcher thread, waiting out a reload in progress so the lock is free
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stopping = threading.Event()
+
+    # In a forked child: keep the index inherited from the parent and start a
+    # watcher of its own, since the parent's thread does not exist here
+    def after_fork(self):
+        self.lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        return self.start()
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "loaded_at": self.loaded_at,
+            "build_seconds": self.build_seconds,
+            "failed_reloads": self.failed,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,244 @@
+# Offline evaluation of second-stage ranking of retrieved records. The retriever
+# fetches a generous candidate list, a reranker scores every candidate against
+# the question, and select() keeps the best ones that fit a token budget.
+#
+# The app does not rerank: on the held-out questions no configuration tried
+# (lexical, 10-30 candidates, 100-300 tokens, 1-3 records) beat the single best
+# retrieved record (k=1) on accuracy at equal context, and lexical top-1 was
+# worse. Wire a reranker into the app only once this shows a win.
+#
+#   python rerank.py   # context tokens and accuracy on held-out questions, against k=1
+import json
+import math
+import os
+
+from retrieval import tokenize
+
+_encoding = None
+
+
+def count_tokens(text):
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # Not installed, or the encoding file can't be fetched offline
+            _encoding = False
+    return len(_encoding.encode(text)) if _encoding else math.ceil(len(text) / 4)
+
+
+class Reranker:
+    def scores(self, query, docs):
+        raise NotImplementedError
+
+    def select(self, query, docs, budget, max_records=3, cutoff=0.5):
+        """Best-scoring docs, best first, within ``budget`` tokens.
+
+        Candidates scoring below ``cutoff`` times the best score are left out;
+        the best candidate is always kept, even if it alone exceeds the budget.
+        """
+        if not docs:
+            return []
+        scores = self.scores(query, docs)
+        ranked = sorted(range(len(docs)), key=lambda i: -scores[i])  # Stable: retriever order breaks ties
+        best = scores[ranked[0]]
+        chosen, used = [], 0
+        for i in ranked:
+            if len(chosen) == max_records or (chosen and scores[i] < cutoff * best):
+                break
+            tokens = count_tokens(docs[i].page_content)
+            if chosen and used + tokens > budget:
+                continue
+            chosen.append(docs[i])
+            used += tokens
+        return chosen
+
+
+class LexicalReranker(Reranker):
+    """IDF-weighted overlap between the question and each record's keywords.
+
+    Recall is the share of the question's term weight found in the record
+    (keywords count fully, answer text half); precision is the share of the
+    record's keyword weight the question mentions. The score is their F1, so a
+    record whose keyword list is mostly about something else ranks below one
+    that matches it closely.
+    """
+
+    def __init__(self, index):
+        self.index = index  # BM25Index, for its IDF table
+        self.unseen_idf = max(index.idf.values(), default=1.0)
+
+    def idf(self, term):
+        return self.index.idf.get(term, self.unseen_idf)
+
+    def scores(self, query, docs):
+        query_terms = set(tokenize(query))
+        query_weight = sum(self.idf(t) for t in query_terms)
+        if not query_weight:
+            return [0.0] * len(docs)
+        scores = []
+        for doc in docs:
+            keyword_terms = set(tokenize(doc.metadata.get("keywords", "")))
+            text_terms = set(tokenize(doc.page_content))
+            recall = sum(self.idf(t) if t in keyword_terms else 0.5 * self.idf(t)
+                         for t in query_terms if t in text_terms or t in keyword_terms) / query_weight
+            keyword_weight = sum(self.idf(t) for t in keyword_terms)
+            precision = sum(self.idf(t) for t in keyword_terms & query_terms) / keyword_weight if keyword_weight else 0.0
+            scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+        return scores
+
+
+class CrossEncoderReranker(Reranker):
+    """A sentence-transformers cross-encoder run on CPU; needs the sentence-transformers package."""
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def scores(self, query, docs):
+        logits = self.model.predict([(query, doc.page_content) for doc in docs])
+        return [1 / (1 + math.exp(-float(x))) for x in logits]  # Probabilities, so cutoff is a ratio of positives
+
+
+# "lexical", "cross-encoder" or "cross-encoder:<model name>"; "none" or empty disables reranking
+def create_reranker(spec, index):
+    if not spec or spec == "none":
+        return None
+    if spec == "lexical":
+        return LexicalReranker(index)
+    if spec.startswith("cross-encoder"):
+        _, _, model_name = spec.partition(":")
+        return CrossEncoderReranker(model_name) if model_name else CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker {spec!r}")
+
+
+# Knowledge records an expected answer was written from: the closest by word
+# overlap, plus any tied with it (the theme records share one answer template)
+def source_records(answer, records, min_similarity=0.3, tie=0.02):
+    words = set(tokenize(answer))
+    similarity = []
+    for record in records:
+        record_words = set(tokenize(record["response"]))
+        union = words | record_words
+        similarity.append(len(words & record_words) / len(union) if union else 0.0)
+    best = max(similarity, default=0.0)
+    if best < min_similarity:
+        return set()
+    return {records[i]["text"] for i, value in enumerate(similarity) if value >= best - tie}
+
+
+# Labelled (question, expected answer) pairs from JSONL splits, leaving out
+# questions copied from a knowledge record's keywords: retrieval finds those by
+# construction, so they say nothing about questions visitors actually type
+def load_questions(file_paths, records):
+    from singleflight import normalize_question
+    copied = set()
+    for record in records:
+        copied.add(normalize_question(record["keywords"]))
+        copied.update(normalize_question(phrase) for phrase in record["keywords"].split(","))
+    rows, excluded = [], 0
+    for file_path in file_paths:
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                messages = {m["role"]: m["content"] for m in json.loads(line)["messages"]}
+                question = messages["user"].removeprefix("Keyword:").strip()
+                if normalize_question(question) in copied:
+                    excluded += 1
+                else:
+                    rows.append((question, messages["assistant"]))
+    return rows, excluded
+
+
+# Context size and accuracy of a retriever on labelled questions: an answer
+# counts as correct when its source record is among the stuffed records
+def evaluate(retriever, classifier, records, rows, margins=(None, None), select=None):
+    """Routes like the app (``intent.route`` with ``margins``); ``classifier``
+    may be None to route nothing. ``select(question, docs)``, when given, picks
+    the records to stuff from the retrieved ones."""
+    from intent import route
+    examples = tokens = answerable = correct = top1 = 0
+    k = retriever.search_kwargs["k"]
+    for question, answer in rows:
+        routing = route(classifier, question, *margins)[1] if classifier else {}
+        retriever.search_kwargs = {"k": k, **routing}
+        docs = retriever.invoke(question)
+        if select is not None:
+            docs = select(question, docs)
+        examples += 1
+        tokens += sum(count_tokens(doc.page_content) for doc in docs)
+        sources = source_records(answer, records)
+        if sources:
+            answerable += 1
+            correct += any(doc.page_content in sources for doc in docs)
+            top1 += bool(docs) and docs[0].page_content in sources
+    return {
+        "examples": examples,
+        "answerable": answerable,
+        "context_tokens": tokens / examples if examples else 0.0,
+        "accuracy": correct / answerable if answerable else 0.0,
+        "top1_accuracy": top1 / answerable if answerable else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from intent import INPUT_DIR, TRAIN_FILES, IntentClassifier, routing_margins
+    from knowledge import load_records, to_documents
+    from retrieval import BM25Index, HybridRetriever
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Compare stuffed-context size and accuracy with and without reranking")
+    parser.add_argument("--knowledge", default=os.path.join(base_dir, "prepared_data_ver3.txt"))
+    parser.add_argument("--questions", nargs="+", default=[
+        os.path.join(INPUT_DIR, name) for name in ("heldout_questions.jsonl", "validation.jsonl", "test.jsonl")
+    ], help="labelled JSONL splits; questions copied from the knowledge keywords are left out")
+    parser.add_argument("--reranker", default="lexical", help="lexical, cross-encoder or cross-encoder:<model>")
+    parser.add_argument("--candidates", type=int, default=30, help="records retrieved for reranking")
+    parser.add_argument("--budget", type=int, default=300, help="context token budget after reranking")
+    parser.add_argument("--max-records", type=int, default=3)
+    parser.add_argument("--no-vectors", action="store_true", help="BM25 only, without embedding calls")
+    parser.add_argument("--no-intent", action="store_true", help="retrieve without category routing")
+    parser.add_argument("--intent-margin", type=float, help="INTENT_MARGIN to route with (default: calibrated)")
+    parser.add_argument("--filter-margin", type=float, help="INTENT_FILTER_MARGIN to route with (default: calibrated)")
+    args = parser.parse_args()
+
+    records = load_records(args.knowledge)
+    docs = to_documents(records, source=args.knowledge)
+    index = BM25Index(docs)
+    if args.no_vectors:
+        class NoVectors:
+            def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+                return []
+        vector_store = NoVectors()
+    else:
+        from llm import get_embeddings
+        from sharedindex import SharedVectorIndex
+        vector_store = SharedVectorIndex.load_or_build(docs, get_embeddings())
+    classifier = None if args.no_intent else IntentClassifier.from_files(TRAIN_FILES + [args.knowledge])
+    margins = routing_margins(classifier, TRAIN_FILES + [args.knowledge]) if classifier else (None, None)
+    margins = tuple(given if given is not None else calibrated
+                    for given, calibrated in zip((args.intent_margin, args.filter_margin), margins))
+    rows, excluded = load_questions(args.questions, records)
+
+    # The app retrieves k=1
+    reranker = create_reranker(args.reranker, index)
+    configurations = [
+        ("k=1 (no reranker)", HybridRetriever(index=index, vector_store=vector_store, search_kwargs={"k": 1}), None),
+        ("k=3", HybridRetriever(index=index, vector_store=vector_store, search_kwargs={"k": 3}), None),
+        (f"rerank {args.reranker} top {args.candidates}, {args.budget} tokens", HybridRetriever(
+            index=index, vector_store=vector_store, search_kwargs={"k": args.candidates}, candidates=args.candidates),
+         lambda question, docs: reranker.select(question, docs, args.budget, max_records=args.max_records)),
+    ]
+    reports = [(name, evaluate(retriever, classifier, records, rows, margins, select))
+               for name, retriever, select in configurations]
+    baseline = reports[0][1]["context_tokens"]
+    for name, report in reports:
+        change = report["context_tokens"] / baseline - 1 if baseline else 0.0
+        print(f"{name:<40} context {report['context_tokens']:6.1f} tokens ({change:+.0%} vs k=1)  "
+              f"accuracy {report['accuracy']:.1%}  top-1 {report['top1_accuracy']:.1%}")
+    print(f"Examples: {report['examples']}, with a source record: {report['answerable']}, "
+          f"copied from the knowledge keywords and left out: {excluded}")
@@ -0,0 +1,178 @@
+# Hybrid retrieval over knowledge records: an in-memory BM25 inverted index
+# over record keywords and text, fused with dense similarity scores from the
+# shared vector index (sharedindex.py)
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+
+from intent import WORD_RE, STOPWORDS
+
+
+# Content words only; BM25 handles term weighting itself
+def tokenize(text):
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, documents, k1=1.5, b=0.75, keyword_weight=2):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self.lengths = []
+        for i, doc in enumerate(documents):
+            # Keywords are counted keyword_weight times so they outrank incidental mentions in the answer text
+            tokens = tokenize(doc.page_content) + tokenize(doc.metadata.get("keywords", "")) * (keyword_weight - 1)
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((i, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(documents)
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+
+    # True when every content word of the query is an indexed term
+    def covers(self, query):
+        terms = tokenize(query)
+        return bool(terms) and all(t in self.postings for t in terms)
+
+    # Return (doc index, score) pairs, best first
+    def search(self, query, k=10, filter=None):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if filter:
+            scores = {i: s for i, s in scores.items()
+                      if all(self.documents[i].metadata.get(key) == value for key, value in filter.items())}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses BM25 and vector scores; short keyword queries skip the embedding call.
+
+    ``search_kwargs`` mirrors ``VectorStore.as_retriever``: ``k`` and an
+    optional metadata ``filter``. Scores from each side are scaled to [0, 1]
+    and combined as ``alpha * vector + (1 - alpha) * bm25``. An optional
+    ``boost`` (metadata to match, like ``filter``) adds ``boost_weight`` to
+    matching records instead of excluding the rest.
+    """
+
+    index: BM25Index
+    vector_store: Any
+    search_kwargs: Dict[str, Any] = {"k": 1}
+    candidates: int = 10
+    alpha: float = 0.5
+    max_keyword_terms: int = 4
+    boost_weight: float = 0.15
+    agree_overlap: float = 0.5
+
+    # True when the lexical top-k for ``query`` starts with the same record as ``docs``
+    # and holds at least ``agree_overlap`` of them; a cheap, embedding-free check
+    # that two queries would retrieve the same thing
+    def agrees(self, query, docs):
+        k = max(self.search_kwargs.get("k", 1), len(docs))
+        top = [self.index.documents[i].page_content for i, _ in self.index.search(query, k, self.search_kwargs.get("filter"))]
+        if not top or top[0] != docs[0].page_content:
+            return False
+        return sum(doc.page_content in top for doc in docs) >= self.agree_overlap * len(docs)
+
+    # Keyword-only questions ("assault", "calendar icon") are answered by BM25 alone
+    def is_keyword_query(self, query):
+        return len(WORD_RE.findall(query.lower())) <= self.max_keyword_terms and self.index.covers(query)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        k = self.search_kwargs.get("k", 1)
+        filter = self.search_kwargs.get("filter")
+        return self.ranked(query, self.candidates, filter)[:k]
+
+    # Up to ``candidates`` documents, best first
+    def ranked(self, query, candidates, filter=None):
+        lexical = self.index.search(query, candidates, filter)
+        keyword_only = bool(lexical) and self.is_keyword_query(query)
+
+        fused = defaultdict(float)
+        docs = {}
+        if lexical:
+            top = lexical[0][1]
+            weight = 1.0 if keyword_only else 1 - self.alpha
+            for i, score in lexical:
+                doc = self.index.documents[i]
+                docs[doc.page_content] = doc
+                fused[doc.page_content] += weight * score / top
+
+        if not keyword_only:
+            vector_kwargs = {"filter": filter} if filter else {}
+            for doc, score in self.vector_store.similarity_search_with_relevance_scores(query, k=candidates, **vector_kwargs):
+                docs.setdefault(doc.page_content, doc)
+                fused[doc.page_content] += self.alpha * max(score, 0.0)
+
+        boost = self.search_kwargs.get("boost")
+        if boost:
+            for content, doc in docs.items():
+                if all(doc.metadata.get(field) == value for field, value in boost.items()):
+                    fused[content] += self.boost_weight
+
+        return [docs[content] for content in sorted(fused, key=fused.get, reverse=True)]
+
+
+# Raw-query retrievals started alongside the rewrite call; threads are created on first use
+_speculation_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-retrieval")
+
+
+def create_speculative_retriever(llm, retriever, prompt):
+    """Drop-in for ``create_history_aware_retriever`` that retrieves for the raw
+    input while the model rewrites it into a standalone query.
+
+    When the rewritten query's lexical top records match the raw results
+    (``HybridRetriever.agrees``) those results are used as they are; otherwise,
+    or if the raw retrieval failed, the rewritten query is retrieved as usual. Without chat history there is no
+    rewrite and the input goes straight to the retriever.
+    """
+    rewrite = prompt | llm | StrOutputParser()
+
+    def retrieve(inputs, config):
+        if not inputs.get("chat_history"):
+            return retriever.invoke(inputs["input"], config)
+
+        start = time.perf_counter()
+
+        def raw_retrieval():
+            docs = retriever.invoke(inputs["input"], config)
+            return docs, time.perf_counter() - start
+
+        speculative = _speculation_pool.submit(raw_retrieval)
+        query = rewrite.invoke(inputs, config)
+        rewrite_seconds = time.perf_counter() - start
+        try:
+            raw_docs, raw_seconds = speculative.result()
+        except Exception as e:  # Only an optimisation: retrieve for the rewritten query instead
+            logging.warning(f"Speculative retrieval failed: {e}")
+            raw_docs, raw_seconds = [], 0.0
+
+        if raw_docs and retriever.agrees(query, raw_docs):
+            docs, retrieval_seconds, outcome = raw_docs, raw_seconds, "reused"
+        else:
+            retrieval_start = time.perf_counter()
+            docs = retriever.invoke(query, config)
+            retrieval_seconds, outcome = time.perf_counter() - retrieval_start, "re-retrieved"
+        # Against the sequential chain: rewrite, then retrieval of whichever results were used
+        elapsed = time.perf_counter() - start
+        saved = rewrite_seconds + retrieval_seconds - elapsed
+        logging.info(f"Speculative retrieval {outcome}: rewrite {rewrite_seconds * 1000:.0f} ms, "
+                     f"retrieval {retrieval_seconds * 1000:.0f} ms, saved {saved * 1000:.0f} ms")
+        return docs
+
+    return RunnableLambda(retrieve).with_config(run_name="chat_retriever_chain")
@@ -0,0 +1,207 @@
+# Shared conversation history and answer cache, so consecutive messages from
+# one visitor can land on any instance behind the load balancer. Each request
+# makes one round trip to load (history + cached answer) and one to save.
+#
+# SESSION_STORE_URL picks the backend:
+#   redis://host:6379/0     Redis (needs the redis package), pipelined
+#   sqlite:///path/to.db    SQLite in WAL mode, for one machine or tests
+#   (unset)                 in-process only, as before
+#
+# If the shared backend fails, FallbackStore serves from in-process storage
+# until it has been reachable again for a retry.
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MAX_TURNS = 6  # Question/answer pairs of history kept per session
+SESSION_TTL = 1800  # Seconds a session lives after its last message
+CACHE_TTL = 3600  # Seconds a cached answer is served
+PRUNE_INTERVAL = 300  # Seconds between sweeps of expired rows from the SQLite tables
+
+
+class LocalStore:
+    """In-process store with the same interface as the shared backends."""
+
+    name = "local"
+
+    def __init__(self, max_sessions=10000, max_answers=10000):
+        self.sessions = OrderedDict()  # session id -> (expires at, turns)
+        self.answers = OrderedDict()  # cache key -> (expires at, answer)
+        self.max_sessions = max_sessions
+        self.max_answers = max_answers
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _get(table, key):
+        entry = table.get(key)
+        if entry is None or entry[0] < time.time():
+            table.pop(key, None)
+            return None
+        table.move_to_end(key)
+        return entry[1]
+
+    def load(self, session_id, cache_key):
+        with self.lock:
+            turns = self._get(self.sessions, session_id) if session_id else None
+            return list(turns or []), self._get(self.answers, cache_key)
+
+    def save(self, session_id, turn, cache_key=None, answer=None):
+        now = time.time()
+        with self.lock:
+            if session_id:
+                turns = (self._get(self.sessions, session_id) or []) + [turn]
+                self.sessions[session_id] = (now + SESSION_TTL, turns[-MAX_TURNS:])
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            if cache_key and answer is not None:
+                self.answers[cache_key] = (now + CACHE_TTL, answer)
+                while len(self.answers) > self.max_answers:
+                    self.answers.popitem(last=False)
+
+
+class SQLiteStore:
+    """SQLite in WAL mode: readers never block the single writer, and every
+    process on the machine sees the same sessions."""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # One connection per thread
+        self.next_prune = 0.0
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS turns (session TEXT, at REAL, turn TEXT)")
+            db.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session, at)")
+            db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, expires REAL, answer TEXT)")
+
+    def _connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=2)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def load(self, session_id, cache_key):
+        db = self._connection()
+        now = time.time()
+        # One read transaction for both lookups
+        with db:
+            rows = db.execute(
+                "SELECT turn FROM (SELECT turn, at FROM turns WHERE session = ? AND at > ? ORDER BY at DESC LIMIT ?) "
+                "ORDER BY at", (session_id or "", now - SESSION_TTL, MAX_TURNS)
+            ).fetchall()
+            answer = db.execute("SELECT answer FROM answers WHERE key = ? AND expires > ?", (cache_key, now)).fetchone()
+        return [json.loads(turn) for turn, in rows], json.loads(answer[0]) if answer else None
+
+    def save(self, session_id, turn, cache_key=None, answer=None):
+        db = self._connection()
+        now = time.time()
+        with db:
+            if session_id:
+                db.execute("INSERT INTO turns VALUES (?, ?, ?)", (session_id, now, json.dumps(turn)))
+                db.execute("DELETE FROM turns WHERE session = ? AND at < ?", (session_id, now - SESSION_TTL))
+            if cache_key and answer is not None:
+                db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)",
+                           (cache_key, now + CACHE_TTL, json.dumps(answer)))
+            # Expired answers and abandoned sessions are never read again; sweep them now and then
+            if now >= self.next_prune:
+                self.next_prune = now + PRUNE_INTERVAL
+                db.execute("DELETE FROM answers WHERE expires < ?", (now,))
+                db.execute("DELETE FROM turns WHERE at < ?", (now - SESSION_TTL,))
+
+
+class RedisStore:
+    """Redis, with each load and each save sent as one pipeline."""
+
+    name = "redis"
+
+    def __init__(self, url):
+        import redis  # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def load(self, session_id, cache_key):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(f"chat:session:{session_id or ''}", -MAX_TURNS, -1)
+        pipe.get(f"chat:answer:{cache_key}")
+        turns, answer = pipe.execute()
+        return [json.loads(turn) for turn in turns], json.loads(answer) if answer else None
+
+    def save(self, session_id, turn, cache_key=None, answer=None):
+        pipe = self.client.pipeline(transaction=False)
+        if session_id:
+            key = f"chat:session:{session_id}"
+            pipe.rpush(key, json.dumps(turn))
+            pipe.ltrim(key, -MAX_TURNS, -1)
+            pipe.expire(key, SESSION_TTL)
+        if cache_key and answer is not None:
+            pipe.set(f"chat:answer:{cache_key}", json.dumps(answer), ex=CACHE_TTL)
+        pipe.execute()
+
+
+class FallbackStore:
+    """Uses ``primary`` and falls back to in-process storage for ``retry_after``
+    seconds whenever it raises, so a backend outage costs context, not answers."""
+
+    def __init__(self, primary, retry_after=30):
+        self.primary = primary
+        self.local = primary if isinstance(primary, LocalStore) else LocalStore()
+        self.retry_after = retry_after
+        self.down_until = 0.0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _call(self, method, *args):
+        if self.primary is not self.local and time.monotonic() >= self.down_until:
+            try:
+                return getattr(self.primary, method)(*args)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.down_until = time.monotonic() + self.retry_after
+                logging.error(f"Session store {self.primary.name} unavailable, using in-process storage: {e}")
+        return getattr(self.local, method)(*args)
+
+    def load(self, session_id, cache_key):
+        turns, answer = self._call("load", session_id, cache_key)
+        with self.lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return turns, answer
+
+    def save(self, session_id, turn, cache_key=None, answer=None):
+        self._call("save", session_id, turn, cache_key, answer)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": self.primary.name,
+                "degraded": time.monotonic() < self.down_until,
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "errors": self.errors,
+            }
+
+
+def create_store(url=None):
+    if not url:
+        primary = LocalStore()
+    elif url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            primary = RedisStore(url)
+        except ImportError:
+            logging.error("SESSION_STORE_URL is a Redis URL but the redis package is not installed; "
+                          "using in-process storage")
+            primary = LocalStore()
+    elif url.startswith("sqlite:///"):
+        primary = SQLiteStore(url[len("sqlite:///"):])
+    else:
+        raise ValueError(f"Unsupported SESSION_STORE_URL {url!r}")
+    return FallbackStore(primary)
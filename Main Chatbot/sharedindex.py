@@ -0,0 +1,189 @@
+# Read-only vector index shared by every gunicorn worker. Record embeddings
+# are written once to INDEX_DIR as a .npy matrix named after the hash of the
+# records, and each process opens it with mmap_mode="r": the pages sit once in
+# the OS page cache however many workers map them.
+#
+# Layout inside INDEX_DIR:
+#   <hash>.npy        - (records, dim) float32 matrix of unit-length embeddings
+#   <hash>.keys.json  - [record id, sha1 of the record's text] for each row, in row order
+#   <hash>.<name>.json - data derived from the matrix (see SharedVectorIndex.sidecar)
+#   .lock             - serialises builds between processes
+#
+# A new version only embeds records whose id is new or whose text changed;
+# records whose id has gone are dropped. To see what a new knowledge file would
+# change against the latest index before deploying it:
+#
+#   python sharedindex.py new_knowledge.txt
+import fcntl
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+INDEX_DIR = os.getenv("INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"))
+KEEP_VERSIONS = 3  # Index files kept for processes still mapping an older version
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# (keys file name, [(record id, text key), ...]) for every complete index version, oldest first
+def _versions(index_dir):
+    versions = []
+    for name in sorted(os.listdir(index_dir), key=lambda n: os.path.getmtime(os.path.join(index_dir, n))):
+        if not name.endswith(".keys.json"):
+            continue
+        if not os.path.exists(os.path.join(index_dir, name[:-len(".keys.json")] + ".npy")):
+            continue
+        with open(os.path.join(index_dir, name), encoding="utf-8") as f:
+            entries = [tuple(entry) for entry in json.load(f)]
+        versions.append((name, entries))
+    return versions
+
+
+# Rows of earlier index files, by text key, so unchanged records are not embedded again
+def _previous_rows(index_dir):
+    rows = {}
+    for name, entries in _versions(index_dir):
+        vectors = np.load(os.path.join(index_dir, name[:-len(".keys.json")] + ".npy"), mmap_mode="r")
+        rows.update((key, vectors[i]) for i, (_, key) in enumerate(entries))
+    return rows
+
+
+def diff(docs, index_dir=INDEX_DIR):
+    """Record ids of ``docs`` that are added, changed, unchanged or removed against the latest index."""
+    versions = _versions(index_dir) if os.path.isdir(index_dir) else []
+    live = dict(versions[-1][1]) if versions else {}
+    result = {"added": [], "changed": [], "unchanged": [], "removed": []}
+    for doc in docs:
+        key = live.get(doc.metadata["id"])
+        if key is None:
+            result["added"].append(doc.metadata["id"])
+        elif key != text_key(doc.page_content):
+            result["changed"].append(doc.metadata["id"])
+        else:
+            result["unchanged"].append(doc.metadata["id"])
+    ids = {doc.metadata["id"] for doc in docs}
+    result["removed"] = [record_id for record_id in live if record_id not in ids]
+    return result
+
+
+def _prune(index_dir, keep):
+    matrices = sorted(
+        (n for n in os.listdir(index_dir) if n.endswith(".npy")),
+        key=lambda n: os.path.getmtime(os.path.join(index_dir, n)),
+        reverse=True,
+    )
+    for name in matrices[keep:]:
+        stem = name[:-len(".npy")] + "."
+        for path in os.listdir(index_dir):
+            if path.startswith(stem):
+                try:
+                    os.remove(os.path.join(index_dir, path))
+                except FileNotFoundError:
+                    pass
+
+
+class SharedVectorIndex:
+    """Cosine-similarity search over documents backed by a memory-mapped matrix.
+
+    Provides ``similarity_search_with_relevance_scores``, the one vector store
+    method HybridRetriever uses, with the same ``filter`` on metadata.
+    """
+
+    def __init__(self, docs, vectors, embeddings, embedded=0, index_dir=INDEX_DIR, name=None):
+        self.docs = docs
+        self.vectors = vectors
+        self.embeddings = embeddings
+        self.embedded = embedded  # Records this process had to embed to build the file
+        self.index_dir = index_dir
+        self.name = name
+
+    @classmethod
+    def load_or_build(cls, docs, embeddings, index_dir=INDEX_DIR):
+        keys = [text_key(doc.page_content) for doc in docs]
+        name = hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+        matrix_path = os.path.join(index_dir, name + ".npy")
+        os.makedirs(index_dir, exist_ok=True)
+        embedded = 0
+
+        # lockf locks belong to the process, so a worker forked mid-build never inherits one
+        with open(os.path.join(index_dir, ".lock"), "w") as lock:
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            if not os.path.exists(matrix_path):
+                changes = diff(docs, index_dir)
+                logging.info(f"Building index {name[:12]}: {len(changes['added'])} added, {len(changes['changed'])} "
+                             f"changed, {len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged")
+                previous = _previous_rows(index_dir)
+                missing = [i for i, key in enumerate(keys) if key not in previous]
+                if missing:
+                    fresh = embeddings.embed_documents([docs[i].page_content for i in missing])
+                    previous.update((keys[i], vector) for i, vector in zip(missing, fresh))
+                    embedded = len(missing)
+                matrix = normalize_rows([previous[key] for key in keys])
+
+                with open(os.path.join(index_dir, name + ".keys.json"), "w", encoding="utf-8") as f:
+                    json.dump([[doc.metadata["id"], key] for doc, key in zip(docs, keys)], f)
+                # Written under a temporary name and renamed, so readers only ever see a complete file
+                tmp_path = matrix_path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(tmp_path, matrix_path)
+                _prune(index_dir, KEEP_VERSIONS)
+
+        return cls(docs, np.load(matrix_path, mmap_mode="r"), embeddings, embedded, index_dir, name)
+
+    def sidecar(self, kind, compute):
+        """JSON data derived from this index, computed by the first process that asks."""
+        path = os.path.join(self.index_dir, f"{self.name}.{kind}.json")
+        if not os.path.exists(path):
+            with open(os.path.join(self.index_dir, ".lock"), "w") as lock:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+                if not os.path.exists(path):
+                    with open(path + ".tmp", "w", encoding="utf-8") as f:
+                        json.dump(compute(), f)
+                    os.replace(path + ".tmp", path)
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None):
+        query_vector = normalize_rows(self.embeddings.embed_query(query))
+        scores = np.asarray(self.vectors @ query_vector)
+        candidates = range(len(self.docs))
+        if filter:
+            candidates = [i for i in candidates
+                          if all(self.docs[i].metadata.get(field) == value for field, value in filter.items())]
+        ranked = sorted(candidates, key=lambda i: scores[i], reverse=True)[:k]
+        return [(self.docs[i], float(scores[i])) for i in ranked]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from knowledge import load_records, to_documents
+
+    parser = argparse.ArgumentParser(description="Show what a knowledge file would change in the latest index")
+    parser.add_argument("knowledge_file")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    records = load_records(args.knowledge_file)
+    by_id = {record["id"]: record for record in records}
+    changes = diff(to_documents(records), args.index_dir)
+    for group in ("added", "changed", "removed"):
+        print(f"{group}: {len(changes[group])}")
+        for record_id in changes[group]:
+            record = by_id.get(record_id)
+            print(f"    {record_id}  {record['category']} / {record['keywords']}" if record else f"    {record_id}")
+    print(f"unchanged: {len(changes['unchanged'])}")
+    print(f"Embeddings a rebuild would request: {len(changes['added']) + len(changes['changed'])}")
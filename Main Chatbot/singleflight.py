@@ -0,0 +1,69 @@
+# Single-flight request coalescing: concurrent calls with the same key share
+# one computation and every waiter receives its result (or its exception)
+import hashlib
+import re
+import threading
+
+PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+# Questions that differ only in case, punctuation or spacing share a key
+def normalize_question(text):
+    return " ".join(PUNCTUATION_RE.sub(" ", text.lower()).split())
+
+
+# Key for a question plus the conversation it was asked in
+def request_key(question, chat_history=()):
+    history = "\n".join(f"{m.type}:{m.content}" for m in chat_history)
+    return hashlib.sha1(f"{normalize_question(question)}\n{history}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0    # Calls that ran the computation
+        self.suppressed = 0  # Calls that waited for another caller's result
+
+    def do(self, key, fn, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.suppressed += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "executed": self.executed,
+                "suppressed": self.suppressed,
+                "in_flight": len(self.calls),
+            }
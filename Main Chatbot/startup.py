@@ -0,0 +1,55 @@
+# Staged startup: the app module imports only what health checks and log
+# downloads need, then a background thread runs the slow stages (heavy
+# imports, index build, chain warm-up) while the process already serves
+import logging
+import threading
+import time
+
+
+class StagedStartup:
+    """Runs ``(name, fn)`` stages in order and records how long each took.
+
+    ``started`` is when the app module began importing, so the reported
+    elapsed times include the import itself.
+    """
+
+    def __init__(self, stages, started=None):
+        self.stages = stages
+        self.started = started if started is not None else time.perf_counter()
+        self.timings = {}
+        self.stage = None
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        self.timings["import"] = round(time.perf_counter() - self.started, 3)
+        for name, fn in self.stages:
+            self.stage = name
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.error = f"{name}: {e}"
+                logging.error(f"Startup stage '{name}' failed: {e}")
+                break
+            finally:
+                self.timings[name] = round(time.perf_counter() - start, 3)
+        self.stage = None
+        logging.info(f"Startup finished in {time.perf_counter() - self.started:.2f}s: {self.timings}")
+        self.done.set()
+
+    def start(self, background=True):
+        if background:
+            threading.Thread(target=self.run, name="startup", daemon=True).start()
+        else:
+            self.run()
+        return self
+
+    def status(self):
+        return {
+            "finished": self.done.is_set(),
+            "stage": self.stage,
+            "error": self.error,
+            "stage_seconds": dict(self.timings),
+            "elapsed_seconds": round(time.perf_counter() - self.started, 3),
+        }
@@ -0,0 +1,77 @@
+# Cold-start report: starts a fresh interpreter with -X importtime, imports
+# app.py and times the first /healthz response and readiness from process
+# start, then lists the slowest top-level imports. Run it against the stub so
+# no real OpenAI calls are made, e.g.
+#
+#   python stub_openai.py --port 8001 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python startup_report.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = """
+import json
+import app
+client = app.app.test_client()
+print("first_response", client.get("/healthz").status_code, flush=True)
+app.startup.done.wait({timeout})
+print("ready", client.get("/readyz").status_code, flush=True)
+print("stages", json.dumps(app.startup.status()), flush=True)
+"""
+
+
+# Total import time (sum of self times) and cumulative time per top-level
+# package, from -X importtime output. Imports from the startup thread interleave
+# with the main thread's, so nesting depth is unreliable; the entry named
+# exactly after a package still carries that package's own cumulative time.
+def parse_importtime(lines):
+    total = 0
+    packages = {}
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        name = name.strip()
+        if "." not in name:
+            packages[name] = max(packages.get(name, 0), int(cumulative))
+    return total, packages
+
+
+def run(timeout, top):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        start = time.perf_counter()
+        child = subprocess.Popen(
+            [sys.executable, "-X", "importtime", "-c", CHILD.format(timeout=timeout)],
+            cwd=here, stdout=subprocess.PIPE, stderr=stderr, text=True,
+        )
+        events = {}
+        for line in child.stdout:
+            name, _, value = line.strip().partition(" ")
+            events[name] = (time.perf_counter() - start, value)
+        child.wait()
+        stderr.seek(0)
+        total, packages = parse_importtime(stderr)
+
+    for name in ("first_response", "ready"):
+        if name in events:
+            seconds, status = events[name]
+            print(f"{name:>15}: {seconds:6.2f}s after process start (HTTP {status})")
+    if "stages" in events:
+        print(f"{'stages':>15}: {json.loads(events['stages'][1])['stage_seconds']}")
+    print(f"\nTotal import time {total / 1e6:.2f}s; slowest packages (cumulative, overlapping):")
+    for name, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{us / 1e6:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure app cold start with -X importtime")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for readiness")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    run(args.timeout, args.top)
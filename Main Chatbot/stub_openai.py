@@ -0,0 +1,152 @@
+# Local stand-in for the OpenAI API, for testing without real calls.
+# Serves /v1/chat/completions and /v1/embeddings with deterministic output.
+#
+#   python stub_openai.py --port 8001 --latency-ms 300
+#   python stub_openai.py --port 8001 --chat-latency lognormal:800,0.5 --embed-latency uniform:50-150 --error-rate 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python app.py
+#
+# Latency specs, all in milliseconds:
+#   constant:300          always 300
+#   uniform:100-500       evenly spread between 100 and 500
+#   exp:300               exponential with mean 300
+#   lognormal:300,0.5     log-normal with median 300 and sigma 0.5 (a long tail)
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 1536
+
+
+# Returns a function giving one latency sample in seconds
+def parse_latency(spec):
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "constant", kind
+    if kind == "constant":
+        value = float(args) / 1000
+        return lambda: value
+    if kind == "uniform":
+        low, high = (float(v) / 1000 for v in args.split("-"))
+        return lambda: random.uniform(low, high)
+    if kind == "exp":
+        mean = float(args) / 1000
+        return lambda: random.expovariate(1 / mean) if mean > 0 else 0.0
+    if kind == "lognormal":
+        median, sigma = (float(v) for v in args.split(","))
+        return lambda: random.lognormvariate(math.log(median / 1000), sigma)
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+# Deterministic unit vector derived from the text, so identical inputs embed identically
+def fake_embedding(text):
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    values = [(seed[i % len(seed)] - 127.5) / 127.5 for i in range(EMBEDDING_DIM)]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+# Emulates provider prompt caching: the prompt prefix shared with an earlier
+# request counts as cached once it is at least 1024 tokens (STUB_CACHE_MIN_TOKENS),
+# in 128-token steps
+_recent_prompts = []
+_prompts_lock = threading.Lock()
+
+
+def prompt_usage(messages):
+    prompt = "".join(f"{m.get('role')}:{m.get('content')}" for m in messages)
+    with _prompts_lock:
+        shared = max((len(os.path.commonprefix([prompt, p])) for p in _recent_prompts), default=0)
+        _recent_prompts.append(prompt)
+        del _recent_prompts[:-100]
+    prompt_tokens = len(prompt) // 4  # Rough characters-per-token estimate
+    cached = shared // 4 // 128 * 128
+    return prompt_tokens, cached if cached >= int(os.getenv("STUB_CACHE_MIN_TOKENS", "1024")) else 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+    chat_latency = staticmethod(lambda: 0.0)
+    embed_latency = staticmethod(lambda: 0.0)
+    error_rate = 0.0
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.embed_latency() if self.path.endswith("/embeddings") else self.chat_latency())
+        if random.random() < self.error_rate:
+            self._send_json(500, {"error": {"message": "Injected stub failure", "type": "server_error"}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            messages = request.get("messages", [{}])
+            last = messages[-1].get("content", "")
+            prompt_tokens, cached_tokens = prompt_usage(messages)
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Stub answer to: {str(last)[:200]}"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": 10,
+                    "total_tokens": prompt_tokens + 10,
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            })
+        elif self.path.endswith("/embeddings"):
+            inputs = request.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            self._send_json(200, {
+                "object": "list",
+                "model": request.get("model", "stub"),
+                "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(json.dumps(text))}
+                         for i, text in enumerate(inputs)],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet under load
+
+
+def serve(port=8001, chat_latency="constant:0", embed_latency=None, error_rate=0.0):
+    StubHandler.chat_latency = staticmethod(parse_latency(chat_latency))
+    StubHandler.embed_latency = staticmethod(parse_latency(embed_latency or chat_latency))
+    StubHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub OpenAI API on http://127.0.0.1:{port}/v1 (chat latency {chat_latency}, "
+          f"embedding latency {embed_latency or chat_latency}, error rate {error_rate})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0, help="constant latency for every call")
+    parser.add_argument("--chat-latency", help="latency spec for chat completions (overrides --latency-ms)")
+    parser.add_argument("--embed-latency", help="latency spec for embeddings (default: same as chat)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    args = parser.parse_args()
+    serve(args.port, args.chat_latency or f"constant:{args.latency_ms}", args.embed_latency, args.error_rate)
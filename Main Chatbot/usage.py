@@ -0,0 +1,24 @@
+# Token usage collection for one request's LLM calls. Kept apart from llm.py
+# because the langchain callback base class is only needed once chains run.
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Collects prompt and cached-prompt token counts for the LLM calls of one request."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.calls = 0
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+                self.calls += 1
+
+    @property
+    def cached_ratio(self):
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
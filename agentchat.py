@@ -1,4 +1,8 @@
 import os
+import re
+import math
+import shutil
+from collections import Counter
 from dotenv import load_dotenv
 from langchain_community.document_loaders import TextLoader
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
@@ -8,7 +12,6 @@ from langchain_community.vectorstores import Chroma
 from langchain.chains import create_retrieval_chain
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
-from langchain.agents import MultiAgentManager, create_agent_executor
 
 # Load environment variables
 load_dotenv()
@@ -16,21 +19,45 @@ load_dotenv()
 # Import constants for API key
 import constants
 
+# Source file and persisted index directory for each domain
+DOMAINS = {
+    "map": ("Raw data - maps.txt", "chroma_map"),
+    "dashboard": ("Raw data - dashboard.txt", "chroma_dashboard"),
+}
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# One embeddings client shared by every agent, created on first use
+_embedding = None
+
+def get_embedding():
+    global _embedding
+    if _embedding is None:
+        _embedding = OpenAIEmbeddings(openai_api_key=constants.APIKEY)
+    return _embedding
+
 # Function to load text file
 def load_text(file_path):
     loader = TextLoader(file_path, encoding='utf-8')
     return loader.load()
 
-# Function to create vector store
-def create_db(docs):
-    embedding = OpenAIEmbeddings(openai_api_key=constants.APIKEY)
-    return Chroma.from_documents(docs, embedding=embedding)
+# Function to open the persisted vector store, building it only when missing or older than its source
+def load_db(file_path, persist_directory):
+    index_is_fresh = (
+        os.path.isdir(persist_directory) and os.listdir(persist_directory)
+        and os.path.getmtime(persist_directory) >= os.path.getmtime(file_path)
+    )
+    if index_is_fresh:
+        return Chroma(persist_directory=persist_directory, embedding_function=get_embedding())
+    # from_documents adds to an existing collection, so a stale index would end up holding every chunk twice
+    shutil.rmtree(persist_directory, ignore_errors=True)
+    return Chroma.from_documents(load_text(file_path), embedding=get_embedding(), persist_directory=persist_directory)
 
 # Base class for agents
 class Agent:
-    def __init__(self, name, documents):
+    def __init__(self, name, vector_store):
         self.name = name
-        self.vector_store = create_db(documents)
+        self.vector_store = vector_store
         self.chain = self.create_chain()
 
     def create_chain(self):
@@ -81,32 +108,70 @@ class Agent:
 
 # MapAgent and DashboardAgent classes inheriting from Agent
 class MapAgent(Agent):
-    def __init__(self, documents):
-        super().__init__("Map", documents)
+    def __init__(self, vector_store):
+        super().__init__("Map", vector_store)
 
 class DashboardAgent(Agent):
-    def __init__(self, documents):
-        super().__init__("Dashboard", documents)
+    def __init__(self, vector_store):
+        super().__init__("Dashboard", vector_store)
+
+AGENT_CLASSES = {"map": MapAgent, "dashboard": DashboardAgent}
+
+class AgentRouter:
+    """Routes each question to a domain agent, building agents only when first needed.
+
+    The domain is picked by a local keyword scorer: every domain's source file
+    is read once into a term set, and a question scores the summed IDF of its
+    words found in that set (plus a bonus for naming the domain itself). Ties
+    and unmatched questions stay with the previous domain.
+    """
+
+    def __init__(self, domains=DOMAINS, agent_classes=AGENT_CLASSES, default="map"):
+        self.domains = {name: paths for name, paths in domains.items() if os.path.exists(paths[0])}
+        missing = set(domains) - set(self.domains)
+        if missing:
+            print(f"No source file for: {', '.join(sorted(missing))}")
+        if not self.domains:
+            raise FileNotFoundError("None of the domain source files exist")
+        self.agent_classes = agent_classes
+        self.current = default if default in self.domains else next(iter(self.domains))
+        self.agents = {}
+
+        self.vocab = {}
+        for name, (file_path, _) in self.domains.items():
+            with open(file_path, encoding='utf-8') as f:
+                self.vocab[name] = set(WORD_RE.findall(f.read().lower()))
+        df = Counter(term for terms in self.vocab.values() for term in terms)
+        n = len(self.vocab)
+        self.idf = {term: math.log((1 + n) / count) for term, count in df.items()}
+
+    def classify(self, question):
+        words = set(WORD_RE.findall(question.lower()))
+        scores = {}
+        for name, terms in self.vocab.items():
+            scores[name] = sum(self.idf[w] for w in words & terms) + (1.0 if name in words else 0.0)
+        best = max(scores, key=scores.get)
+        if scores[best] <= scores.get(self.current, 0.0):
+            return self.current
+        return best
+
+    def get_agent(self, name):
+        if name not in self.agents:
+            file_path, persist_directory = self.domains[name]
+            self.agents[name] = self.agent_classes[name](load_db(file_path, persist_directory))
+        return self.agents[name]
+
+    def process_chat(self, question, chat_history):
+        name = self.classify(question)
+        if name != self.current:
+            print(f"Switching to {name} agent.")
+            self.current = name
+        return self.get_agent(name).process_chat(question, chat_history)
 
 # Main program
 if __name__ == '__main__':
-    # Load documents for map and dashboard
-    map_docs = load_text('Raw data - maps.txt')
-    dashboard_docs = load_text('Raw data - dashboard.txt')
-
-    # Create agents for map and dashboard
-    map_agent = MapAgent(map_docs)
-    dashboard_agent = DashboardAgent(dashboard_docs)
-
-    # Create agent executors
-    map_agent_executor = create_agent_executor(llm=ChatOpenAI(api_key=constants.APIKEY), tools=[map_agent.chain], verbose=True)
-    dashboard_agent_executor = create_agent_executor(llm=ChatOpenAI(api_key=constants.APIKEY), tools=[dashboard_agent.chain], verbose=True)
-
-    # Define MultiAgentManager to manage both agents
-    multi_agent_manager = MultiAgentManager(agents={
-        "map": map_agent_executor,
-        "dashboard": dashboard_agent_executor
-    })
+    # Agents are created lazily by the router on their first question
+    router = AgentRouter()
 
     chat_history = []
     question_count = 0  # Counter for the number of questions
@@ -117,14 +182,14 @@ if __name__ == '__main__':
             print("Ending conversation. Goodbye!")
             break
 
-        # Use MultiAgentManager to process input and switch agents automatically
-        response = multi_agent_manager.run(user_input)
-        
+        # Route the question to the map or dashboard agent
+        response = router.process_chat(user_input, chat_history)
+
         chat_history.append(HumanMessage(content=user_input))
         chat_history.append(AIMessage(content=response))
-        
+
         print("Assistant:", response)
-        
+
         question_count += 1  # Increment the question counter
 
         # Check if five questions have been asked
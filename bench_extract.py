@@ -0,0 +1,55 @@
+# bench_extract.py
+# Compare the old BeautifulSoup(html.parser).get_text() path with extract.py
+# on saved HTML pages: parse time per page and text volume sent to Embedder.
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from extract import HAVE_LXML, BoilerplateFilter, extract_page
+
+FIXTURE_DIR = Path("fixtures/html")
+REPEAT = 50
+
+
+def bench(name, pages, fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        texts = [fn(html) for html in pages]
+    elapsed = time.perf_counter() - start
+    per_page_ms = elapsed / (REPEAT * len(pages)) * 1000
+    chars = sum(len(text) for text in texts)
+    print(f"{name:<28} {per_page_ms:8.3f} ms/page {chars:8d} chars")
+    return per_page_ms, chars
+
+
+def baseline(html):
+    return BeautifulSoup(html, "html.parser").get_text()
+
+
+def extracted(html):
+    return extract_page(html)[1]
+
+
+def main():
+    fixture_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else FIXTURE_DIR
+    pages = [path.read_text(encoding="utf-8") for path in sorted(fixture_dir.glob("*.html"))]
+    if not pages:
+        print(f"No HTML fixtures found in {fixture_dir}")
+        return
+    print(f"{len(pages)} pages from {fixture_dir}, parser: {'lxml' if HAVE_LXML else 'html.parser'}")
+
+    base_ms, base_chars = bench("html.parser + get_text", pages, baseline)
+    new_ms, _ = bench("extract_page", pages, extracted)
+
+    # Boilerplate filtering is stateful across a crawl, so measure it over one pass
+    boilerplate = BoilerplateFilter(min_pages=2)
+    filtered_chars = sum(len(boilerplate.filter(extracted(html))) for html in pages)
+    print(f"{'extract_page + boilerplate':<28} {'':>16} {filtered_chars:8d} chars")
+
+    print(f"Speed-up {base_ms / new_ms:.1f}x, text volume {filtered_chars / base_chars:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
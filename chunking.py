@@ -0,0 +1,61 @@
+# chunking.py
+# Token-offset chunking for embedding: each document is tokenized once and cut
+# on sentence boundaries, with overlap between consecutive chunks.
+import re
+from bisect import bisect_left, bisect_right
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+_encoding = None
+
+
+def _get_encoding():
+    # One tokenizer per process, created on first use so pool workers build their own
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def chunk_document(text: str, max_tokens: int = 500, overlap: int = 50) -> list:
+    """Split text into (chunk_text, n_tokens) pairs of at most max_tokens tokens.
+
+    The document is encoded once and sliced on token offsets. Chunk ends snap back
+    to the last sentence boundary in the second half of the window, and each chunk
+    after the first starts up to ``overlap`` tokens before the previous end, at a
+    sentence start when one falls inside the overlap.
+    """
+    encoding = _get_encoding()
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return [(text, len(tokens))]
+
+    # Token index at which each sentence starts: the token covering the whitespace after
+    # the punctuation, since BPE tokens carry their leading space (" The")
+    _, offsets = encoding.decode_with_offsets(tokens)
+    boundaries = sorted({bisect_left(offsets, m.start()) for m in SENTENCE_END_RE.finditer(text)})
+
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        if end < len(tokens):
+            i = bisect_right(boundaries, end) - 1
+            if i >= 0 and boundaries[i] > start + max_tokens // 2:
+                end = boundaries[i]
+        chunks.append((encoding.decode(tokens[start:end]).strip(), end - start))
+        if end == len(tokens):
+            break
+
+        next_start = max(end - overlap, start + 1)
+        i = bisect_left(boundaries, next_start)
+        if i < len(boundaries) and boundaries[i] < end:
+            next_start = boundaries[i]
+        start = next_start
+    return chunks
+
+
+def count_tokens(texts: list) -> list:
+    """Token count of each text, with the same tokenizer the chunks are cut with."""
+    encoding = _get_encoding()
+    return [len(encoding.encode(text)) for text in texts]
@@ -0,0 +1,70 @@
+# crawlstore.py
+# Append-only document store for crawled pages.
+#
+# Layout inside the store directory:
+#   documents.dat  - page texts (utf-8) appended one after another
+#   index.jsonl    - one line per saved page: url hash, byte offset, length, url, title
+#
+# Pages are keyed by the hash of their canonical URL. Saving a URL again
+# appends a new version and the index keeps the latest one, so nothing is
+# ever overwritten in place and query-string variants cannot collide.
+import hashlib
+import json
+import mmap
+from pathlib import Path
+
+from dedup import canonicalize_url
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha1(canonicalize_url(url).encode("utf-8")).hexdigest()[:16]
+
+
+class CrawlStore:
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.data_path = self.store_dir / "documents.dat"
+        self.index_path = self.store_dir / "index.jsonl"
+        self.index = {}  # url key -> index entry (latest version)
+        if self.index_path.exists():
+            with self.index_path.open(encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.index[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url: str):
+        return url_key(url) in self.index
+
+    def put(self, url: str, text: str, title: str = "") -> str:
+        """Append a page to the store and return its url key."""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        data = text.encode("utf-8")
+        with self.data_path.open("ab") as f:
+            offset = f.tell()
+            f.write(data)
+        entry = {"key": url_key(url), "offset": offset, "length": len(data), "url": url, "title": title}
+        # The index line is written after the data, so a crash never leaves an entry pointing past the end
+        with self.index_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.index[entry["key"]] = entry
+        return entry["key"]
+
+    def get(self, url: str):
+        entry = self.index.get(url_key(url))
+        if entry is None:
+            return None
+        with self.data_path.open("rb") as f:
+            f.seek(entry["offset"])
+            return f.read(entry["length"]).decode("utf-8")
+
+    def iter_documents(self):
+        """Yield ``(url, title, text)`` for the latest version of every page."""
+        if not self.index or not self.data_path.exists() or self.data_path.stat().st_size == 0:
+            return
+        with self.data_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for entry in sorted(self.index.values(), key=lambda e: e["offset"]):
+                text = data[entry["offset"]:entry["offset"] + entry["length"]].decode("utf-8")
+                yield entry["url"], entry["title"], text
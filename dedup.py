@@ -0,0 +1,119 @@
+# dedup.py
+# URL canonicalisation and content fingerprinting shared by the crawlers
+# (demo1.Crawler, webscrape.py) and demo1.Embedder.
+import hashlib
+import re
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Query parameters that never change the page content
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "fbclid", "gclid"}
+
+WORD_RE = re.compile(r"\w+")
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalise a URL so that trivially different spellings map to one key.
+
+    Lower-cases the scheme and host, drops default ports, the fragment and
+    tracking parameters, sorts the remaining query parameters and strips
+    the trailing slash from the path.
+    """
+    parts = urlparse(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/") or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if k.lower() not in TRACKING_PARAMS))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def content_hash(text: str) -> str:
+    # Exact fingerprint of the whitespace/case normalised text
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles, used for near-duplicate detection."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class Deduplicator:
+    """Tracks content already seen during a crawl or embedding run.
+
+    Exact duplicates are found through a hash set. Near duplicates are found
+    by SimHash: the 64-bit fingerprint is split into ``max_distance + 1``
+    bands, so any fingerprint within ``max_distance`` bits of a stored one
+    shares at least one band with it and only those candidates are compared.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.band_bits = 64 // (max_distance + 1)
+        self.hashes = set()
+        self.bands = {}
+        self.checked = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _band_keys(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.max_distance + 1):
+            yield band, fingerprint >> (band * self.band_bits) & mask
+
+    def is_duplicate(self, text: str) -> bool:
+        """Return True if ``text`` duplicates earlier content, else record it."""
+        self.checked += 1
+        digest = content_hash(text)
+        if digest in self.hashes:
+            self.exact_duplicates += 1
+            return True
+
+        fingerprint = simhash(text)
+        candidates = set()
+        for key in self._band_keys(fingerprint):
+            candidates.update(self.bands.get(key, ()))
+        if any(hamming_distance(fingerprint, other) <= self.max_distance for other in candidates):
+            self.near_duplicates += 1
+            return True
+
+        self.hashes.add(digest)
+        for key in self._band_keys(fingerprint):
+            self.bands.setdefault(key, []).append(fingerprint)
+        return False
+
+    @property
+    def dedup_ratio(self) -> float:
+        # Fraction of checked items that were dropped as duplicates
+        if not self.checked:
+            return 0.0
+        return (self.exact_duplicates + self.near_duplicates) / self.checked
+
+    def report(self) -> str:
+        return (f"checked {self.checked}, exact duplicates {self.exact_duplicates}, "
+                f"near duplicates {self.near_duplicates}, dedup ratio {self.dedup_ratio:.1%}")
@@ -1,9 +1,13 @@
 # crawler.py
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 from pathlib import Path
 import loguru
+from dedup import Deduplicator, canonicalize_url
+from extract import BoilerplateFilter, extract_page
+from crawlstore import CrawlStore, url_key
+from docstore import DocumentStore, record_id
+from vectorstore import DTYPES, VectorFile, save_vectors
 
 logger = loguru.logger
 
@@ -14,27 +18,38 @@ class Crawler:
         self.domain = urlparse(start_url).netloc
         self.output_dir = output_dir
         self.visited = set()
+        self.dedup = Deduplicator()
+        self.boilerplate = BoilerplateFilter()
+        self.store = CrawlStore(output_dir)
+        self.saved = []  # URLs saved by this crawl, in order
 
     def crawl(self):
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.links_file = self.output_dir / "links.txt"  # Create a file path for storing the links
         self._crawl_recursive(self.start_url)
+        self._strip_late_boilerplate()
+        logger.info(f"Crawl finished: {len(self.visited)} URLs, {self.dedup.report()}")
 
     def _crawl_recursive(self, url: str):
-        if url in self.visited:
+        key = canonicalize_url(url)  # Query/fragment/trailing-slash variants share one key
+        if key in self.visited:
             return
-        self.visited.add(url)
+        self.visited.add(key)
 
         try:
             response = requests.get(url)
             if not response.headers.get('Content-Type', '').startswith('text/html'):
                 return
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            self._save_content(url, soup.get_text())
+            title, text, links = extract_page(response.text)
+            text = self.boilerplate.filter(text)
+            if self.dedup.is_duplicate(text):
+                logger.info(f"Skipped duplicate content at {url}")
+            else:
+                self._save_content(url, text, title)
 
-            for link in soup.find_all('a', href=True):
-                next_url = urljoin(url, link['href'])
+            for href in links:
+                next_url = urljoin(url, href)
                 if self._should_crawl(next_url):
                     self._save_links(next_url)  # Save the discovered link before crawling it
                     self._crawl_recursive(next_url)
@@ -43,23 +58,28 @@ class Crawler:
             logger.error(f"Error crawling {url}: {e}")
 
     def _should_crawl(self, url: str) -> bool:
-        return urlparse(url).netloc == self.domain and url not in self.visited
-
-    #def _save_content(self, url: str, content: str):
-        #file_path = self.output_dir / f"{urlparse(url).path.strip('/')}.txt"
-        #file_path.parent.mkdir(parents=True, exist_ok=True)
-        #file_path.write_text(content, encoding='utf-8')
-        #logger.info(f"Saved content from {url} to {file_path}")
-        
-    def _save_content(self, url: str, content: str):
-        file_path = self.output_dir / f"{urlparse(url).path.strip('/')}.txt"
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        try:
-            file_path.write_text(content, encoding='utf-8')  # Use 'utf-8' encoding
-            logger.info(f"Saved content from {url} to {file_path}")
-        except UnicodeEncodeError as e:
-            logger.error(f"Error saving content from {url}: {e}")
-        
+        return urlparse(url).netloc == self.domain and canonicalize_url(url) not in self.visited
+
+    def _save_content(self, url: str, content: str, title: str = ""):
+        # Pages go into the append-only crawl store keyed by URL hash, so no page can overwrite another
+        title = title or urlparse(url).path.strip('/').rsplit('/', 1)[-1] or self.domain
+        key = self.store.put(url, content, title)
+        self.saved.append(url)
+        logger.info(f"Saved content from {url} to {self.store.data_path} ({key})")
+
+    def _strip_late_boilerplate(self):
+        # Pages saved before a block had been seen on enough pages to count as
+        # boilerplate (at least the first min_pages - 1) still hold it; save a
+        # cleaned version of each one that does
+        cleaned_pages = 0
+        for url in self.saved:
+            text = self.store.get(url)
+            cleaned = self.boilerplate.clean(text)
+            if cleaned != text:
+                title = self.store.index[url_key(url)]["title"]
+                self.store.put(url, cleaned, title)
+                cleaned_pages += 1
+        logger.info(f"Removed late-detected boilerplate from {cleaned_pages} of {len(self.saved)} pages")
 
     def _save_links(self, url: str):
         # Open the links file in append mode and write the URL of the discovered link to the file
@@ -67,129 +87,225 @@ class Crawler:
             f.write(url + "\n")
         logger.info(f"Saved link: {url}")  # Log the saving of the link for tracking
 
-    def _crawl_recursive(self, url: str):
-        if url in self.visited:
-            return
-        self.visited.add(url)
-
-        try:
-            response = requests.get(url)
-            if not response.headers.get('Content-Type', '').startswith('text/html'):
-                return
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            self._save_content(url, soup.get_text())
-
-            for link in soup.find_all('a', href=True):
-                next_url = urljoin(url, link['href'])
-                if self._should_crawl(next_url):
-                    self._crawl_recursive(next_url)
-
-        except Exception as e:
-            logger.error(f"Error crawling {url}: {e}")
-
-    def _should_crawl(self, url: str) -> bool:
-        return urlparse(url).netloc == self.domain and url not in self.visited
-
-    def _save_content(self, url: str, content: str):
-        file_path = self.output_dir / f"{urlparse(url).path.strip('/')}.txt"
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_text(content)
-        logger.info(f"Saved content from {url} to {file_path}")
-
 
 # embedding.py
 import pandas as pd
 from pathlib import Path
-import tiktoken
+from concurrent.futures import ProcessPoolExecutor
 from openai import OpenAI
 import numpy as np
-
+from chunking import chunk_document
 
 class Embedder:
-    def __init__(self, input_dir: Path, output_dir: Path, openai_client: OpenAI):
+    def __init__(self, input_dir: Path, output_dir: Path, openai_client: OpenAI,
+                 chunk_overlap: int = 50, workers: int = None, vector_dtype: str = "float16"):
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.openai_client = openai_client
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
         self.max_tokens = 500
+        self.chunk_overlap = chunk_overlap
+        self.workers = workers
+        self.vector_dtype = vector_dtype
+        self._token_counts = {}  # Chunk text -> n_tokens, filled by chunk_items
 
     def process(self):
+        # Only chunks that are new or changed since the last run are embedded; chunks
+        # of pages that disappeared or shrank are deleted from the document store
+        store = DocumentStore(self.output_dir / 'docstore')
+        changes = store.sync(self.chunk_items(), self._embed)
+        logger.info(f"Document store sync: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+                    f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged")
+        return self._save_embeddings(store)
+
+    def chunk_items(self) -> list:
+        """Deduplicated chunks of every crawled page, each with an id from its URL and position in the page."""
         df = self._load_and_process_text()
         df = self._split_text(df)
-        df = self._get_embeddings(df)
-        self._save_embeddings(df)
-        return df
+        df = self._drop_duplicates(df)
+        self._token_counts = dict(zip(df['text'], df['n_tokens']))  # Chunk texts are unique after dedup
+        return df.to_dict('records')
 
     def _load_and_process_text(self) -> pd.DataFrame:
-        texts = []
-        for file in self.input_dir.glob('*.txt'):
-            text = file.read_text()
-            texts.append((file.stem, text))
+        # Stream every saved page from the crawl store instead of walking the filesystem
+        store = CrawlStore(self.input_dir)
+        texts = list(store.iter_documents())
 
-        df = pd.DataFrame(texts, columns=['title', 'text'])
+        df = pd.DataFrame(texts, columns=['url', 'title', 'text'])
         #df['text'] = df['title'] + ". " + df['text'].str.replace('\s+', ' ', regex=True)
         df['text'] = df['title'] + ". " + df['text'].str.replace(r'\s+', ' ', regex=True)
-        df['n_tokens'] = df['text'].apply(lambda x: len(self.tokenizer.encode(x)))
         return df
 
     def _split_text(self, df: pd.DataFrame) -> pd.DataFrame:
-        shortened = []
-        for _, row in df.iterrows():
-            if row['n_tokens'] > self.max_tokens:
-                shortened.extend(self._split_into_many(row['text']))
-            else:
-                shortened.append(row['text'])
-
-        new_df = pd.DataFrame(shortened, columns=['text'])
-        new_df['n_tokens'] = new_df['text'].apply(lambda x: len(self.tokenizer.encode(x)))
+        # Each document is tokenized exactly once, inside chunk_document; large crawls
+        # are spread over a process pool
+        texts = df['text'].tolist()
+        args = ([self.max_tokens] * len(texts), [self.chunk_overlap] * len(texts))
+        if len(texts) < 32 or self.workers == 1:
+            results = list(map(chunk_document, texts, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(chunk_document, texts, *args, chunksize=16))
+
+        chunks = [(record_id(url_key(url), position), url, text, n_tokens)
+                  for url, result in zip(df['url'], results)
+                  for position, (text, n_tokens) in enumerate(result)]
+        new_df = pd.DataFrame(chunks, columns=['id', 'url', 'text', 'n_tokens'])
+        logger.info(f"Split {len(texts)} documents into {len(new_df)} chunks")
         return new_df
 
-    def _split_into_many(self, text: str) -> list:
-        sentences = text.split('. ')
-        chunks = []
-        current_chunk = []
-        current_token_count = 0
-
-        for sentence in sentences:
-            sentence_tokens = len(self.tokenizer.encode(" " + sentence))
-            if current_token_count + sentence_tokens > self.max_tokens:
-                chunks.append('. '.join(current_chunk) + '.')
-                current_chunk = []
-                current_token_count = 0
-
-            current_chunk.append(sentence)
-            current_token_count += sentence_tokens + 1
-
-        if current_chunk:
-            chunks.append('. '.join(current_chunk) + '.')
-
-        return chunks
-
-    def _get_embeddings(self, df: pd.DataFrame) -> pd.DataFrame:
-        df['embedding'] = df['text'].apply(
-            lambda x: self.openai_client.embeddings.create(input=x, model="text-embedding-ada-002").data[0].embedding)
+    def _drop_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Drop exact and near-duplicate chunks so each is only embedded once
+        dedup = Deduplicator()
+        keep = [not dedup.is_duplicate(text) for text in df['text']]
+        logger.info(f"Chunk dedup: {dedup.report()}")
+        return df[keep].reset_index(drop=True)
+
+    def _embed(self, texts: list) -> np.ndarray:
+        # Reuse the counts from chunking to size the batches; count only texts they don't cover
+        counts = self._token_counts
+        if all(text in counts for text in texts):
+            return embed_texts(self.openai_client, texts, [int(counts[text]) for text in texts])
+        return embed_texts(self.openai_client, texts)
+
+    def _save_embeddings(self, store: DocumentStore) -> pd.DataFrame:
+        # The serving files are a snapshot of the store: vectors go to a compact
+        # memory-mapped file, the parquet table keeps only the chunk text. Writing
+        # them makes no embedding calls
+        entries, matrix = store.live()
+        df = pd.DataFrame([dict(entry['meta'], id=entry['id'], text=entry['text']) for entry in entries])
+        save_vectors(self.output_dir / 'vectors', matrix, dtype=self.vector_dtype)
+        df.to_parquet(self.output_dir / 'chunks.parquet', engine='pyarrow')
         return df
 
-    def _save_embeddings(self, df: pd.DataFrame):
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        df.to_parquet(self.output_dir / 'embeddings.parquet', engine='pyarrow')
-
 
 # qa.py
 from openai import OpenAI
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import csv
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from chunking import count_tokens
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_BATCH_SIZE = 2048  # Most inputs the embeddings endpoint accepts per request
+EMBEDDING_BATCH_TOKENS = 250_000  # Headroom under the endpoint's 300k tokens per request
+CONTEXT_CANDIDATES = 64  # Best chunks kept per question to fill its 1800-token context from
+
+
+def embedding_batches(token_counts: list, max_inputs: int = EMBEDDING_BATCH_SIZE,
+                      max_tokens: int = EMBEDDING_BATCH_TOKENS):
+    # (start, end) slices of at most max_inputs texts and max_tokens tokens; a text over
+    # the token budget on its own still gets a batch of one
+    start = total = 0
+    for i, n_tokens in enumerate(token_counts):
+        if i > start and (i - start == max_inputs or total + n_tokens > max_tokens):
+            yield start, i
+            start, total = i, 0
+        total += n_tokens
+    if start < len(token_counts):
+        yield start, len(token_counts)
+
+
+def embed_texts(openai_client: OpenAI, texts: list, token_counts: list = None) -> np.ndarray:
+    # One (texts, dim) float32 matrix from as few embedding requests as the input and
+    # token limits allow. token_counts are counted here when the caller has none
+    if token_counts is None:
+        token_counts = count_tokens(texts)
+    vectors = []
+    for start, end in embedding_batches(token_counts):
+        response = openai_client.embeddings.create(input=texts[start:end], model=EMBEDDING_MODEL)
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def load_questions(path: Path) -> list:
+    # Questions file: JSONL with a "question" field, or CSV with a "question" column.
+    # An "id" field/column is kept when present, otherwise the line number is used
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        with path.open(newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with path.open(encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [{"id": row.get("id") or str(i), "question": row["question"]}
+            for i, row in enumerate(rows, 1) if row.get("question")]
+
+
+class _Throttle:
+    # Spaces calls evenly so no more than requests_per_minute start in any minute
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
 
 
 class QASystem:
-    def __init__(self, embeddings_path: Path, openai_client: OpenAI):
-        self.df = pd.read_parquet(embeddings_path, engine='pyarrow')
+    def __init__(self, chunks_path: Path, openai_client: OpenAI, vector_dir: Path = None):
+        self.df = pd.read_parquet(chunks_path, engine='pyarrow')
         self.openai_client = openai_client
+        # Memory-mapped chunk embeddings (see vectorstore.py); loading copies nothing
+        self.vectors = VectorFile(vector_dir or Path(chunks_path).parent / 'vectors')
 
     def answer_question(self, question: str, model: str = "gpt-3.5-turbo", max_tokens: int = 150) -> str:
         context = self._create_context(question)
+        return self._complete(question, context, model, max_tokens)
+
+    def answer_batch(self, questions: list, output_path: Path, model: str = "gpt-3.5-turbo",
+                     max_tokens: int = 150, concurrency: int = 8, requests_per_minute: float = 0) -> int:
+        # Embeds every question in batched calls, retrieves context for all of them
+        # with one matrix product, then runs completions concurrently under the rate
+        # limit. Each answer is appended to output_path (JSONL) as soon as it is ready
+        if not questions:
+            return 0
+        q_matrix = embed_texts(self.openai_client, [q["question"] for q in questions])
+        rows, _ = self.vectors.top_k_scores(q_matrix, CONTEXT_CANDIDATES)  # (questions, candidates), best first
+        contexts = [self._context_from_rows(candidates) for candidates in rows]
+
+        throttle = _Throttle(requests_per_minute)
+        write_lock = threading.Lock()
+        failed = 0
+
+        def answer(item, context):
+            throttle.wait()
+            return self._complete(item["question"], context, model, max_tokens)
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        with output_path.open("w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(answer, item, context): item for item, context in zip(questions, contexts)}
+            for future in as_completed(futures):
+                item = futures[future]
+                record = {"id": item["id"], "question": item["question"]}
+                try:
+                    record["answer"] = future.result()
+                except Exception as e:
+                    failed += 1
+                    record["error"] = str(e)
+                    logger.error(f"Question {item['id']} failed: {e}")
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Answered {len(questions) - failed}/{len(questions)} questions in {elapsed:.1f}s "
+                    f"({len(questions) / elapsed:.1f} questions/s), written to {output_path}")
+        return len(questions) - failed
+
+    def _complete(self, question: str, context: str, model: str, max_tokens: int) -> str:
         messages = [
             {"role": "system",
              "content": "You are a helpful assistant. Answer the question based on the context provided."},
@@ -206,24 +322,27 @@ class QASystem:
         return response.choices[0].message.content.strip()
 
     def _create_context(self, question: str, max_len: int = 1800) -> str:
-        q_embedding = self.openai_client.embeddings.create(input=question, model="text-embedding-ada-002").data[
-            0].embedding
-        self.df['distances'] = self.df['embedding'].apply(
-            lambda x: np.dot(x, q_embedding) / (np.linalg.norm(x) * np.linalg.norm(q_embedding)))
+        q_embedding = embed_texts(self.openai_client, [question])[0]
+        rows, _ = self.vectors.top_k_scores(q_embedding, CONTEXT_CANDIDATES)
+        return self._context_from_rows(rows, max_len)
 
+    def _context_from_rows(self, rows: np.ndarray, max_len: int = 1800) -> str:
+        # rows: vector rows best first; chunks are added until max_len tokens
         returns = []
         cur_len = 0
 
-        for _, row in self.df.sort_values('distances', ascending=False).iterrows():
-            cur_len += row['n_tokens']
+        for i in rows:
+            row = self.vectors.row_ids[i]  # Vector row -> chunk table row
+            cur_len += self.df['n_tokens'].iat[row]
             if cur_len > max_len:
                 break
-            returns.append(row['text'])
+            returns.append(self.df['text'].iat[row])
 
         return "\n\n###\n\n".join(returns)
 
 
 # main.py
+import argparse
 import os
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -238,18 +357,33 @@ PROCESSED_DIR = DATA_DIR / "processed"
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Crawl, embed and answer questions about the Atlas site")
+    parser.add_argument("--batch", type=Path, help="answer every question in this JSONL/CSV file instead of prompting")
+    parser.add_argument("--output", type=Path, default=DATA_DIR / "answers.jsonl", help="where batch answers are written")
+    parser.add_argument("--concurrency", type=int, default=8, help="completions in flight at once in batch mode")
+    parser.add_argument("--rpm", type=float, default=0, help="completion requests per minute in batch mode (0 = no limit)")
+    parser.add_argument("--vector-dtype", choices=DTYPES, default="float16", help="storage type for chunk embeddings")
+    parser.add_argument("--skip-crawl", action="store_true", help="reuse the existing embeddings instead of crawling again")
+    args = parser.parse_args()
+
     openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
-    # Step 1: Crawl the website
-    crawler = Crawler(START_URL, CRAWL_DIR)
-    crawler.crawl()
+    if not args.skip_crawl:
+        # Step 1: Crawl the website
+        crawler = Crawler(START_URL, CRAWL_DIR)
+        crawler.crawl()
 
-    # Step 2: Process and embed the text
-    embedder = Embedder(CRAWL_DIR, PROCESSED_DIR, openai_client)
-    embedder.process()
+        # Step 2: Process and embed the text
+        embedder = Embedder(CRAWL_DIR, PROCESSED_DIR, openai_client, vector_dtype=args.vector_dtype)
+        embedder.process()
 
     # Step 3: Set up QA system
-    qa_system = QASystem(PROCESSED_DIR / 'embeddings.parquet', openai_client)
+    qa_system = QASystem(PROCESSED_DIR / 'chunks.parquet', openai_client)
+
+    if args.batch:
+        qa_system.answer_batch(load_questions(args.batch), args.output,
+                               concurrency=args.concurrency, requests_per_minute=args.rpm)
+        return
 
     # Step 4: Answer questions
     while True:
@@ -261,4 +395,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,195 @@
+# docstore.py
+# Append-only embedding store with stable record ids, so a re-crawl or an edited
+# source only embeds and writes the records that actually changed.
+#
+# Layout inside the store directory:
+#   vectors.<n>.f32  - float32 embedding rows appended one after another
+#   index.<n>.jsonl  - one line per operation: {"op": "put", "id", "hash", "row", "text", "meta"}
+#                      or {"op": "delete", "id"}; replaying it gives the live records
+#   meta.json        - embedding dimension and the current generation <n>
+#
+# Upserting a record appends one row and one index line; deleting it appends one
+# index line. Superseded rows are only dropped by compact(), which writes the next
+# generation once dead rows outnumber live ones and switches to it by replacing
+# meta.json, so a crash mid-compaction leaves the previous generation intact.
+#
+#   python docstore.py data/processed/docstore data/crawled   # what a sync would change
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+COMPACT_DEAD_RATIO = 0.5  # Compact after a write once this share of rows is superseded
+
+
+def record_id(*parts) -> str:
+    """Stable id from the fields that identify a record, e.g. category + keywords or URL + chunk position."""
+    return hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class DocumentStore:
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self.meta_path = self.store_dir / "meta.json"
+        meta = json.loads(self.meta_path.read_text()) if self.meta_path.exists() else {}
+        self.dim = meta.get("dim")
+        self.generation = meta.get("generation", 0)
+        self.entries = {}  # record id -> latest put entry
+        self.rows = 0  # Rows in the vectors file, live or superseded
+        if self.index_path.exists():
+            with self.index_path.open(encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["op"] == "delete":
+                        self.entries.pop(entry["id"], None)
+                    else:
+                        self.entries[entry["id"]] = entry
+                        self.rows = max(self.rows, entry["row"] + 1)
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.store_dir / f"vectors.{self.generation}.f32"
+
+    @property
+    def index_path(self) -> Path:
+        return self.store_dir / f"index.{self.generation}.jsonl"
+
+    def _write_meta(self):
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({"dim": self.dim, "generation": self.generation}))
+        os.replace(tmp_path, self.meta_path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, record_id: str):
+        return record_id in self.entries
+
+    def diff(self, items) -> dict:
+        """Ids in ``items`` (dicts with "id" and "text") that are new or changed, and live ids missing from them."""
+        result = {"added": [], "changed": [], "unchanged": [], "removed": []}
+        seen = set()
+        for item in items:
+            seen.add(item["id"])
+            entry = self.entries.get(item["id"])
+            if entry is None:
+                result["added"].append(item["id"])
+            elif entry["hash"] != content_hash(item["text"]):
+                result["changed"].append(item["id"])
+            else:
+                result["unchanged"].append(item["id"])
+        result["removed"] = [i for i in self.entries if i not in seen]
+        return result
+
+    def upsert(self, items, embed) -> list:
+        """Store ``items``, calling ``embed(texts)`` only for new or changed ones; returns the ids embedded.
+
+        Every key of an item other than "id" and "text" is kept as metadata.
+        """
+        items = [item for item in items
+                 if item["id"] not in self.entries or self.entries[item["id"]]["hash"] != content_hash(item["text"])]
+        if not items:
+            return []
+        vectors = np.asarray(embed([item["text"] for item in items]), dtype=np.float32)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._write_meta()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+
+        row_bytes = 4 * self.dim
+        with self.vectors_path.open("ab") as f:
+            first_row = f.tell() // row_bytes
+            if f.tell() % row_bytes:
+                f.truncate(first_row * row_bytes)  # Drop a row torn by an earlier crash
+            f.write(vectors.tobytes())
+        # Index lines are written after the rows, so a crash never leaves an entry pointing past the end
+        with self.index_path.open("a", encoding="utf-8") as f:
+            for row, item in enumerate(items, first_row):
+                entry = {
+                    "op": "put",
+                    "id": item["id"],
+                    "hash": content_hash(item["text"]),
+                    "row": row,
+                    "text": item["text"],
+                    "meta": {key: value for key, value in item.items() if key not in ("id", "text")},
+                }
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.entries[item["id"]] = entry
+        self.rows = first_row + len(items)
+        self._maybe_compact()
+        return [item["id"] for item in items]
+
+    def delete(self, ids) -> list:
+        ids = [i for i in ids if i in self.entries]
+        if not ids:
+            return []
+        with self.index_path.open("a", encoding="utf-8") as f:
+            for i in ids:
+                f.write(json.dumps({"op": "delete", "id": i}) + "\n")
+                del self.entries[i]
+        self._maybe_compact()
+        return ids
+
+    def sync(self, items, embed) -> dict:
+        """Make the store hold exactly ``items``: upsert new and changed ones, delete the rest."""
+        items = list(items)
+        changes = self.diff(items)
+        self.upsert(items, embed)
+        self.delete(changes["removed"])
+        return changes
+
+    def live(self):
+        """Live entries in row order and their embeddings as a (records, dim) array."""
+        entries = sorted(self.entries.values(), key=lambda e: e["row"])
+        if not entries:
+            return [], np.empty((0, self.dim or 0), dtype=np.float32)
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        return entries, np.asarray(matrix[[e["row"] for e in entries]])
+
+    def _maybe_compact(self):
+        if self.rows and (self.rows - len(self.entries)) / self.rows > COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self):
+        """Write the live rows as the next generation and switch to it."""
+        entries, matrix = self.live()
+        old_paths = (self.vectors_path, self.index_path)
+        self.generation += 1
+        self.vectors_path.write_bytes(matrix.tobytes())
+        with self.index_path.open("w", encoding="utf-8") as f:
+            for row, entry in enumerate(entries):
+                entry["row"] = row
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._write_meta()
+        self.rows = len(entries)
+        for path in old_paths:
+            path.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show what syncing a crawl into a document store would change")
+    parser.add_argument("store", type=Path, help="document store directory")
+    parser.add_argument("source", type=Path, help="crawl store directory to compare against it")
+    parser.add_argument("--ids", action="store_true", help="list the ids in each group")
+    args = parser.parse_args()
+
+    from demo1 import Embedder  # Chunking needs tiktoken, only loaded for the CLI
+
+    store = DocumentStore(args.store)
+    changes = store.diff(Embedder(args.source, None, None).chunk_items())
+    for group in ("added", "changed", "removed", "unchanged"):
+        print(f"{group:>9}: {len(changes[group])}")
+        if args.ids and group != "unchanged":
+            for i in changes[group]:
+                print(f"           {i}")
+    print(f"Embeddings a sync would request: {len(changes['added']) + len(changes['changed'])}")
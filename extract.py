@@ -0,0 +1,100 @@
+# extract.py
+# Fast HTML parsing and main-content extraction for crawled pages.
+import hashlib
+from collections import Counter
+
+try:
+    import lxml.html
+    HAVE_LXML = True
+except ImportError:  # Fall back to BeautifulSoup's pure-Python parser
+    from bs4 import BeautifulSoup
+    HAVE_LXML = False
+
+# Elements that never hold page content. <form> is kept: ASP.NET pages wrap the whole body in one
+DROP_TAGS = ["script", "style", "noscript", "template", "svg", "iframe",
+             "nav", "footer", "aside"]
+
+# A <header> is the site banner unless it opens one of these, where it holds the content's own heading
+SECTIONING_TAGS = ["article", "section", "main"]
+
+# Elements that end a line of text when flattened
+BLOCK_TAGS = ["p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr",
+              "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote",
+              "dt", "dd", "br", "hr"]
+
+
+def _clean_lines(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _extract_lxml(html: str):
+    doc = lxml.html.fromstring(html)
+    links = doc.xpath("//a/@href")  # Collect links before nav/footer are dropped
+    title = doc.findtext(".//title") or ""
+    site_header = "//header[not(" + " or ".join(f"ancestor::{tag}" for tag in SECTIONING_TAGS) + ")]"
+    for el in doc.xpath("|".join([f"//{tag}" for tag in DROP_TAGS] + [site_header])):
+        el.drop_tree()
+    main = doc.xpath("//main|//article|//*[@role='main']")
+    root = main[0] if main else doc
+    for el in root.iter(*BLOCK_TAGS):
+        el.tail = "\n" + (el.tail or "")
+    return title.strip(), _clean_lines(root.text_content()), links
+
+
+def _extract_bs4(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    title = soup.title.string if soup.title and soup.title.string else ""
+    site_headers = [tag for tag in soup("header") if not tag.find_parent(SECTIONING_TAGS)]
+    for tag in soup(DROP_TAGS) + site_headers:
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup
+    return title.strip(), _clean_lines(root.get_text("\n")), links
+
+
+def extract_page(html: str):
+    """Parse a page and return ``(title, main_text, links)``.
+
+    Uses lxml when it is installed and BeautifulSoup's html.parser otherwise.
+    Script, style, navigation, footer and aside elements and the site-wide
+    header are removed and, when the page has a <main>/<article> element,
+    only that is kept.
+    """
+    if HAVE_LXML:
+        return _extract_lxml(html)
+    return _extract_bs4(html)
+
+
+class BoilerplateFilter:
+    """Drops text blocks that repeat across many pages of the same site.
+
+    Each line of extracted text is a block. Once a block has been seen on
+    ``min_pages`` different pages it is treated as boilerplate (menus,
+    cookie banners, "contact us" footers that survived tag stripping) and
+    removed from every later page. Pages filtered before a block reached
+    ``min_pages`` still contain it; ``clean`` strips it from them afterwards.
+    """
+
+    def __init__(self, min_pages: int = 3):
+        self.min_pages = min_pages
+        self.block_pages = Counter()
+
+    def _key(self, block: str) -> bytes:
+        return hashlib.sha1(block.lower().encode("utf-8")).digest()
+
+    def clean(self, text: str) -> str:
+        """Remove the blocks known to be boilerplate so far, without counting ``text`` as a page."""
+        return "\n".join(block for block in text.splitlines() if self.block_pages[self._key(block)] < self.min_pages)
+
+    def filter(self, text: str) -> str:
+        kept = []
+        page_blocks = set()
+        for block in text.splitlines():
+            key = self._key(block)
+            if key not in page_blocks:
+                page_blocks.add(key)
+                self.block_pages[key] += 1
+            if self.block_pages[key] < self.min_pages:
+                kept.append(block)
+        return "\n".join(kept)
@@ -1,10 +1,8 @@
 import os
 from dotenv import load_dotenv
-from langchain_community.document_loaders import TextLoader
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import Chroma
 from langchain.chains import create_retrieval_chain
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain.chains.history_aware_retriever import create_history_aware_retriever
@@ -32,21 +30,14 @@ with open(log_filename, mode='w', newline='', encoding='utf-8') as file:
 # Import constants for API key
 import constants
 
-# Function to load text file
-def load_text(file_path):
-    loader = TextLoader(file_path, encoding='utf-8')
-    return loader.load()
-
-# Function to create vector store
-def create_db(docs):
-    embedding = OpenAIEmbeddings(openai_api_key=constants.APIKEY)
-    return Chroma.from_documents(docs, embedding=embedding)
+# Lazily built agents and the local domain scorer are shared with agentchat.py
+from agentchat import AgentRouter
 
 # Base class for agents
 class Agent:
-    def __init__(self, name, documents):
+    def __init__(self, name, vector_store):
         self.name = name
-        self.vector_store = create_db(documents)
+        self.vector_store = vector_store
         self.chain = self.create_chain()
 
     def create_chain(self):
@@ -96,31 +87,23 @@ class Agent:
         return response["answer"]
 
 class MapAgent(Agent):
-    def __init__(self, documents):
-        super().__init__("Map", documents)
+    def __init__(self, vector_store):
+        super().__init__("Map", vector_store)
 
 class DashboardAgent(Agent):
-    def __init__(self, documents):
-        super().__init__("Dashboard", documents)
+    def __init__(self, vector_store):
+        super().__init__("Dashboard", vector_store)
 
 if __name__ == '__main__':    
-    # Load documents for map and dashboard
-    map_docs = load_text('Raw data - maps.txt')
-    dashboard_docs = load_text('Raw data - dashboard.txt')
-    
-    # Create agents for map and dashboard
-    map_agent = MapAgent(map_docs)
-    dashboard_agent = DashboardAgent(dashboard_docs)
+    # Agents are only built (from their persisted index) when first used
+    router = AgentRouter(agent_classes={"map": MapAgent, "dashboard": DashboardAgent})
 
     # Ask user to select an agent once
     selected_agent = input("Please select an agent (type 'map' or 'dashboard'): ").strip().lower()
-    if selected_agent == 'map':
-        agent = map_agent
-    elif selected_agent == 'dashboard':
-        agent = dashboard_agent
+    if selected_agent in router.domains:
+        router.current = selected_agent
     else:
-        print("Invalid choice, defaulting to map agent.")
-        agent = map_agent
+        print(f"Invalid choice, defaulting to {router.current} agent.")
 
     chat_history = []
     question_count = 0  # Counter for the number of questions
@@ -134,18 +117,9 @@ if __name__ == '__main__':
             if user_input.lower() == 'exit':
                 print("Ending conversation. Goodbye!")
                 break
-            
-            # Check if the user wants to switch agents
-            if "dashboard" in user_input.lower() and agent != dashboard_agent:
-                print("Switching to dashboard agent.")
-                agent = dashboard_agent
-                continue
-            elif "map" in user_input.lower() and agent != map_agent:
-                print("Switching to map agent.")
-                agent = map_agent
-                continue
-
-            response = agent.process_chat(user_input, chat_history)
+
+            # The router switches agents when the question belongs to another domain
+            response = router.process_chat(user_input, chat_history)
             chat_history.append(HumanMessage(content=user_input))
             chat_history.append(AIMessage(content=response))
             
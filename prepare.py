@@ -1,39 +1,227 @@
 import os
+import re
+import gzip
 import json
+import time
+import argparse
+import shutil
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
 
 # Maximum number of rows to include in the prepared dataset for each file.
-MAX_ROWS = 10000
+# None means no limit; a limit is reported when it truncates a file.
+MAX_ROWS = None
 
 # Message that is included with every prompt.
 SYSTEM_CONTENT = (
     "Understand and respond to the user's intent based on the keywords."
 )
 
-def prepare_data(input_file, output_file):
-    """Convert a single text file into a JSON Lines file.
-    Args:
-        input_file (str): Path to the input text file.
-        output_file (str): Path to the output JSON Lines file.
-    """
-    current_dir = os.getcwd()  # Get the current working directory
-    dataset = []  # Initialize dataset list
+# Declared schema for every prepared row: a category label and a
+# system/user/assistant conversation with non-empty string contents.
+ROW_SCHEMA = {
+    "label": str,
+    "messages": ["system", "user", "assistant"],
+}
+
+# Columns written to the memory-mappable sidecar next to each JSONL file.
+SIDECAR_COLUMNS = ["label", "keywords", "response"]
+
+KEYWORDS_RE = re.compile(r"Keywords?:\s*(.*)$", re.DOTALL)
+
+class SchemaError(ValueError):
+    pass
+
+def validate_row(row):
+    """Check a row against ROW_SCHEMA, raising SchemaError on the first problem."""
+    if not isinstance(row, dict) or set(row) != set(ROW_SCHEMA):
+        raise SchemaError(f"expected keys {sorted(ROW_SCHEMA)}, got {sorted(row) if isinstance(row, dict) else type(row).__name__}")
+    if not isinstance(row["label"], str) or not row["label"]:
+        raise SchemaError("label must be a non-empty string")
+    messages = row["messages"]
+    if not isinstance(messages, list) or [m.get("role") if isinstance(m, dict) else None for m in messages] != ROW_SCHEMA["messages"]:
+        raise SchemaError(f"messages must have roles {ROW_SCHEMA['messages']}")
+    for message in messages:
+        if set(message) != {"role", "content"} or not isinstance(message["content"], str) or not message["content"]:
+            raise SchemaError(f"{message['role']} message must have only role and non-empty string content")
 
-    # Read the data from the input text file with specified encoding
+def encode_row(row):
+    """Serialise a row to compact UTF-8 JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(row)
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def row_columns(row):
+    """Extract the sidecar columns (label, keywords, response) from a validated row."""
+    match = KEYWORDS_RE.search(row["messages"][1]["content"])
+    keywords = match.group(1).strip() if match else row["messages"][1]["content"]
+    return [row["label"], keywords, row["messages"][2]["content"]]
+
+def read_lines(input_file):
+    """Yield stripped lines from the input text file one at a time."""
     with open(input_file, "r", encoding="utf-8") as f:
-        data = [line.strip() for line in f.readlines()]
+        for line in f:
+            yield line.strip()
 
-    for text in data[:MAX_ROWS]:
+def build_rows(lines):
+    """Turn 'label : keywords : response' lines into chat-format rows."""
+    for text in lines:
         parts = text.split(':', 2)  # Split the line into exactly three parts
         if len(parts) < 3:
             continue  # Skip lines that do not have at least three parts
 
         label_category, keywords, response = parts
+        yield make_row(label_category.strip(), keywords.strip(), response.strip())
+
+def make_row(label, keywords, response):
+    """Build a row in the prepared messages format."""
+    messages = []
+    messages.append({"role": "system", "content": SYSTEM_CONTENT})
+    messages.append({"role": "user", "content": f"Intent: {label}, Keywords: {keywords}"})
+    messages.append({"role": "assistant", "content": response})
+    return {"label": label, "messages": messages}
+
+def load_rows(input_file):
+    """Yield raw rows from either a 'label : keywords : response' text file or an existing JSONL file.
+
+    A JSONL line that does not parse is yielded as a SchemaError, so it is counted
+    as an invalid row instead of aborting the file.
+    """
+    if input_file.endswith(".jsonl"):
+        for line in read_lines(input_file):
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield SchemaError(f"invalid JSON: {e}")
+    else:
+        yield from build_rows(read_lines(input_file))
+
+class ShardWriter:
+    """Write rows to a JSON Lines file, optionally split into shards and gzipped.
+
+    With ``shard_size`` set, ``train.jsonl`` becomes ``train-00000.jsonl``,
+    ``train-00001.jsonl``, ... with at most ``shard_size`` rows each.
+    """
+
+    def __init__(self, output_path, shard_size=None, compress=False):
+        self.base, self.ext = os.path.splitext(output_path)
+        self.shard_size = shard_size
+        self.compress = compress
+        self.shard = 0
+        self.rows_in_shard = 0
+        self.paths = []
+        self.file = None
+
+    def _open(self):
+        path = f"{self.base}-{self.shard:05d}{self.ext}" if self.shard_size else self.base + self.ext
+        if self.compress:
+            path += ".gz"
+        self.paths.append(path)
+        if self.compress:
+            return gzip.open(path, "wb")
+        return open(path, "wb")
+
+    def write(self, row):
+        if self.file is None:
+            self.file = self._open()
+        elif self.shard_size and self.rows_in_shard >= self.shard_size:
+            self.file.close()
+            self.shard += 1
+            self.rows_in_shard = 0
+            self.file = self._open()
+        self.file.write(encode_row(row))
+        self.file.write(b"\n")
+        self.rows_in_shard += 1
 
-        messages = []
-        messages.append({"role": "system", "content": SYSTEM_CONTENT})
-        messages.append({"role": "user", "content": f"Intent: {label_category.strip()}, Keywords: {keywords.strip()}"})
-        messages.append({"role": "assistant", "content": response.strip()})
-        dataset.append({"messages": messages})
+    def close(self):
+        if self.file is None:
+            self.file = self._open()  # Always leave an (empty) output file behind
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.file is not None:
+            self.file.close()
+
+class SidecarWriter:
+    """Columnar copy of the prepared rows that the bot's intent index memory-maps.
+
+    ``train.jsonl`` gets a ``train.cols/`` directory holding, for each column,
+    ``<column>.npy`` (uint8: the UTF-8 values concatenated) and
+    ``<column>.offsets.npy`` (int64: the start of every value plus a final end
+    offset). Both load with ``np.load(path, mmap_mode="r")`` without parsing
+    any JSON. Values are streamed to a temporary file and only get their .npy
+    header when the sidecar is closed, so memory use does not grow with rows.
+    """
+
+    def __init__(self, sidecar_dir, names):
+        os.makedirs(sidecar_dir, exist_ok=True)
+        self.sidecar_dir = sidecar_dir
+        self.names = names
+        self.data = [open(self._path(name, ".bin.tmp"), "wb") for name in names]
+        self.offsets = [array("q", [0]) for _ in names]
+
+    def _path(self, name, suffix):
+        return os.path.join(self.sidecar_dir, name + suffix)
+
+    def append(self, values):
+        for i, value in enumerate(values):
+            self.offsets[i].append(self.offsets[i][-1] + self.data[i].write(value.encode("utf-8")))
+
+    def close(self):
+        for name, data, offsets in zip(self.names, self.data, self.offsets):
+            data.close()
+            with open(self._path(name, ".npy"), "wb") as out, open(data.name, "rb") as values:
+                np.lib.format.write_array_header_1_0(
+                    out, {"descr": "|u1", "fortran_order": False, "shape": (offsets[-1],)})
+                shutil.copyfileobj(values, out)
+            os.remove(data.name)
+            np.save(self._path(name, ".offsets.npy"), np.frombuffer(offsets, dtype=np.int64))
+
+    def discard(self):
+        for data in self.data:
+            data.close()
+        shutil.rmtree(self.sidecar_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()  # Never leave a half-written sidecar behind
+
+def prepare_data(input_file, output_file, max_rows=MAX_ROWS, shard_size=None, compress=False):
+    """Convert a single text file into a JSON Lines file.
+
+    Rows are read, transformed and written one at a time, so memory use does
+    not grow with the size of the input.
+    Args:
+        input_file (str): Path to the input text file.
+        output_file (str): Path to the output JSON Lines file.
+        max_rows (int): Stop after this many rows (None for no limit).
+        shard_size (int): Split the output into files of this many rows.
+        compress (bool): Gzip the output files.
+    Returns:
+        dict: Row count, invalid row count, elapsed time and rows/sec for the file.
+    """
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"No such input file: {input_file}")  # Before any output is created
+
+    current_dir = os.getcwd()  # Get the current working directory
 
     # Prepare output directory inside the current directory
     prepared_dir = os.path.join(current_dir, "prepared")
@@ -42,13 +230,48 @@ def prepare_data(input_file, output_file):
 
     print(f"Saving files to: {output_path}")  # Log the path to check where files are being saved
 
-    # Write the data to the output JSON Lines file
-    with open(output_path, "w", encoding="utf-8") as f:
-        for row in dataset:
-            f.write(json.dumps(row))
-            f.write("\n")
+    start = time.perf_counter()
+    count = 0
+    invalid = 0
+    truncated = False
+    sidecar_dir = os.path.splitext(output_path)[0] + ".cols"
+    with ShardWriter(output_path, shard_size, compress) as writer, SidecarWriter(sidecar_dir, SIDECAR_COLUMNS) as sidecar:
+        for line_no, row in enumerate(load_rows(input_file), 1):
+            if max_rows is not None and count >= max_rows:
+                truncated = True
+                break
+            try:
+                if isinstance(row, SchemaError):
+                    raise row
+                validate_row(row)
+            except SchemaError as e:
+                invalid += 1
+                print(f"{input_file} row {line_no}: {e}")
+                continue
+            # Rebuild every row from its columns so JSONL inputs with other
+            # system prompts come out in the same format as text inputs
+            columns = row_columns(row)
+            writer.write(make_row(*columns))
+            sidecar.append(columns)
+            count += 1
+    elapsed = time.perf_counter() - start
+
+    if invalid:
+        print(f"Warning: {input_file} had {invalid} rows that were not valid JSON or failed schema validation")
+    if truncated:
+        print(f"Warning: {input_file} truncated to {max_rows} rows")
+    rate = count / elapsed if elapsed else 0.0
+    print(f"{input_file}: {count} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec) -> {', '.join(writer.paths)}")
+    return {"input": input_file, "rows": count, "invalid": invalid, "seconds": elapsed, "rows_per_sec": rate}
 
 def main():
+    parser = argparse.ArgumentParser(description="Prepare intent text files as chat-format JSON Lines.")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS, help="limit rows per file")
+    parser.add_argument("--shard-size", type=int, default=None, help="rows per output shard")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output files")
+    parser.add_argument("--workers", type=int, default=None, help="files processed in parallel")
+    args = parser.parse_args()
+
     # Define input and output files
     file_mapping = {
         "train_data.txt": "train.jsonl",
@@ -56,9 +279,21 @@ def main():
         "val_data.txt": "val.jsonl"
     }
 
-    # Process each file pair
-    for input_file, output_file in file_mapping.items():
-        prepare_data(input_file, output_file)
+    # Process the file pairs in parallel
+    start = time.perf_counter()
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(prepare_data, input_file, output_file, args.max_rows, args.shard_size, args.gzip): input_file
+            for input_file, output_file in file_mapping.items()
+        }
+        for future in as_completed(futures):
+            try:
+                total_rows += future.result()["rows"]
+            except OSError as e:
+                print(f"Error preparing {futures[future]}: {e}")
+    elapsed = time.perf_counter() - start
+    print(f"Total: {total_rows} rows in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/sec)")
 
 if __name__ == "__main__":
     main()
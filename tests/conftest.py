@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The chatbot's modules live in "Main Chatbot/", which is not a package; appended so
+# the root modules keep their names (both directories have a main_chatbot.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Main Chatbot"))
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import ConcurrencyGate, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_limited_with_retry_after(clock):
+    limiter = RateLimiter(rate=2.0, burst=3)
+    assert [limiter.reserve("a")[0] for _ in range(3)] == [True] * 3
+    allowed, retry_after = limiter.reserve("a")
+    assert not allowed
+    assert retry_after == pytest.approx(0.5)
+    assert limiter.stats()["limited"] == 1
+
+
+def test_tokens_refill_at_the_rate_up_to_the_burst(clock):
+    limiter = RateLimiter(rate=2.0, burst=3)
+    for _ in range(3):
+        limiter.reserve("a")
+    clock.now += 0.5
+    assert limiter.reserve("a") == (True, 0.0)
+    assert not limiter.reserve("a")[0]
+    clock.now += 60
+    assert [limiter.reserve("a")[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_clients_have_separate_buckets(clock):
+    limiter = RateLimiter(rate=1.0, burst=1)
+    assert limiter.reserve("a")[0]
+    assert not limiter.reserve("a")[0]
+    assert limiter.reserve("b")[0]
+
+
+def test_refund_returns_the_token(clock):
+    limiter = RateLimiter(rate=1.0, burst=1)
+    assert limiter.reserve("a")[0]
+    limiter.refund("a")
+    assert limiter.reserve("a")[0]
+
+
+def test_least_recently_seen_clients_are_dropped(clock):
+    limiter = RateLimiter(rate=1.0, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.reserve(client)
+    assert limiter.stats()["clients"] == 2
+    assert limiter.reserve("a")[0]  # Forgotten, so it starts with a full bucket
+
+
+def test_zero_rate_disables_the_limit(clock):
+    limiter = RateLimiter(rate=0, burst=1)
+    assert all(limiter.reserve("a") == (True, 0.0) for _ in range(10))
+    limiter.refund("a")
+    assert limiter.stats() == {"clients": 0, "limited": 0}
+
+
+def test_gate_queues_then_rejects():
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    assert gate.acquire()
+    assert not gate.acquire()  # Waits in the queue and times out
+    assert gate.stats() == {"running": 1, "waiting": 0, "rejected": 1}
+    gate.release()
+    assert gate.acquire()
+    gate.release()
+
+
+def test_gate_rejects_at_once_when_the_queue_is_full():
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=1, queue_timeout=5)
+    assert gate.acquire()
+    queued = threading.Thread(target=lambda: gate.acquire() and gate.release())
+    queued.start()
+    while gate.stats()["waiting"] < 1:
+        time.sleep(0.001)
+    assert not gate.acquire()
+    gate.release()
+    queued.join()
+    assert gate.stats() == {"running": 0, "waiting": 0, "rejected": 1}
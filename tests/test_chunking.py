@@ -0,0 +1,62 @@
+import re
+
+import pytest
+
+import chunking
+
+TOKEN_RE = re.compile(r"\s*(?:\w+|[^\w\s])")
+
+
+class LeadingSpaceEncoding:
+    """Stands in for cl100k: words and punctuation, each token carrying its leading whitespace."""
+
+    def encode(self, text):
+        return [m.group() for m in TOKEN_RE.finditer(text)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+    def decode_with_offsets(self, tokens):
+        offsets, position = [], 0
+        for token in tokens:
+            offsets.append(position)
+            position += len(token)
+        return self.decode(tokens), offsets
+
+
+@pytest.fixture(autouse=True)
+def fake_encoding(monkeypatch):
+    monkeypatch.setattr(chunking, "_encoding", LeadingSpaceEncoding())
+
+
+def document(sentences=40):
+    return " ".join(f"Sentence number {i} says something about the map here." for i in range(sentences))
+
+
+def test_chunks_end_on_sentence_punctuation():
+    chunks = chunking.chunk_document(document(), max_tokens=50, overlap=10)
+    assert len(chunks) > 1
+    for text, _ in chunks[:-1]:
+        assert text.endswith("."), text
+
+
+def test_chunks_after_the_first_start_at_a_sentence():
+    chunks = chunking.chunk_document(document(), max_tokens=50, overlap=10)
+    for text, _ in chunks[1:]:
+        assert text.startswith("Sentence number"), text
+
+
+def test_chunks_respect_max_tokens_and_overlap():
+    chunks = chunking.chunk_document(document(), max_tokens=50, overlap=15)
+    assert all(n_tokens <= 50 for _, n_tokens in chunks)
+    for (previous, _), (current, _) in zip(chunks, chunks[1:]):
+        assert current.split(".")[0] in previous  # The overlap repeats the previous chunk's last sentence
+
+
+def test_short_document_is_one_chunk():
+    assert chunking.chunk_document("One sentence.", max_tokens=50) == [("One sentence.", 3)]
+
+
+def test_count_tokens_matches_chunk_counts():
+    text = document(3)
+    assert chunking.count_tokens([text, "One sentence."]) == [chunking.chunk_document(text)[0][1], 3]
@@ -0,0 +1,50 @@
+import pytest
+
+from crawlstore import CrawlStore, url_key
+
+
+def test_put_and_get_round_trip(tmp_path):
+    store = CrawlStore(tmp_path)
+    key = store.put("https://example.org/maps", "Map help", "Maps")
+    assert key == url_key("https://example.org/maps")
+    assert store.get("https://example.org/maps") == "Map help"
+    assert "https://example.org/maps" in store
+    assert store.get("https://example.org/other") is None
+
+
+def test_url_variants_share_one_page(tmp_path):
+    store = CrawlStore(tmp_path)
+    store.put("https://Example.org/maps/?b=2&a=1#top", "first")
+    store.put("https://example.org/maps?a=1&b=2&utm_source=x", "second")
+    assert len(store) == 1
+    assert store.get("https://example.org/maps?a=1&b=2") == "second"
+
+
+def test_saving_a_page_again_keeps_only_the_latest_version(tmp_path):
+    store = CrawlStore(tmp_path)
+    store.put("https://example.org/a", "old text", "A")
+    store.put("https://example.org/b", "other page", "B")
+    store.put("https://example.org/a", "new text", "A")
+    expected = [("https://example.org/b", "B", "other page"), ("https://example.org/a", "A", "new text")]
+    assert list(store.iter_documents()) == expected
+    assert list(CrawlStore(tmp_path).iter_documents()) == expected  # Replayed from index.jsonl
+
+
+def test_late_boilerplate_stripping_does_not_duplicate_pages(tmp_path):
+    # What Crawler does: filter each page as it is crawled, then clean and re-save
+    # the pages saved before a block was recognised as boilerplate
+    extract = pytest.importorskip("extract")  # Needs lxml and bs4
+    boilerplate = extract.BoilerplateFilter(min_pages=3)
+    store = CrawlStore(tmp_path)
+    urls = [f"https://example.org/page{i}" for i in range(4)]
+    for i, url in enumerate(urls):
+        store.put(url, boilerplate.filter(f"Page {i} content\nContact us"))
+    for url in urls:
+        text = store.get(url)
+        cleaned = boilerplate.clean(text)
+        if cleaned != text:
+            store.put(url, cleaned)
+
+    documents = list(store.iter_documents())
+    assert [url for url, _, _ in documents] == urls[2:] + urls[:2]  # Re-saved pages come last
+    assert sorted(text for _, _, text in documents) == [f"Page {i} content" for i in range(4)]
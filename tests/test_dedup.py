@@ -0,0 +1,37 @@
+from dedup import Deduplicator, canonicalize_url, hamming_distance, simhash
+
+PAGE = " ".join(f"Indicator {i} of the Atlas map shows wellbeing outcome {i * 7} for every region in year {2000 + i}."
+                for i in range(40))
+
+
+def test_canonical_url_drops_noise():
+    assert canonicalize_url("HTTPS://Example.org:443//maps/?b=2&utm_source=x&a=1#top") == "https://example.org/maps?a=1&b=2"
+    assert canonicalize_url("http://example.org") == "http://example.org/"
+
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    dedup = Deduplicator()
+    assert not dedup.is_duplicate(PAGE)
+    assert dedup.is_duplicate("  " + PAGE.upper().replace(" ", "\n  "))
+    assert dedup.exact_duplicates == 1
+
+
+def test_near_duplicates_are_caught():
+    dedup = Deduplicator()
+    assert not dedup.is_duplicate(PAGE)
+    assert dedup.is_duplicate(PAGE.replace("outcome 14 ", "outcome 15 "))
+    assert dedup.near_duplicates == 1
+
+
+def test_different_content_is_kept():
+    dedup = Deduplicator()
+    assert not dedup.is_duplicate(PAGE)
+    assert not dedup.is_duplicate("Immunisation rates are reported per local government area and year.")
+    assert dedup.dedup_ratio == 0.0
+
+
+def test_simhash_distance_grows_with_the_change():
+    base = simhash(PAGE)
+    assert hamming_distance(base, simhash(PAGE)) == 0
+    assert hamming_distance(base, simhash(PAGE + " Extra words at the end.")) < hamming_distance(
+        base, simhash("Something else entirely, about calendars and school terms."))
@@ -0,0 +1,65 @@
+import numpy as np
+
+from docstore import DocumentStore, record_id
+
+
+class Embed:
+    """Fake embedding call: 2-d vectors from the text length, counting what it was asked to embed."""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def items(**texts):
+    return [{"id": record_id(key), "text": text, "url": key} for key, text in texts.items()]
+
+
+def test_sync_embeds_only_new_and_changed_records(tmp_path):
+    store = DocumentStore(tmp_path)
+    embed = Embed()
+    store.sync(items(a="one", b="two", c="three"), embed)
+    assert embed.texts == ["one", "two", "three"]
+
+    embed = Embed()
+    changes = store.sync(items(a="one", b="TWO!", d="four"), embed)
+    assert embed.texts == ["TWO!", "four"]
+    assert changes == {"added": [record_id("d")], "changed": [record_id("b")],
+                       "unchanged": [record_id("a")], "removed": [record_id("c")]}
+    assert len(store) == 3 and record_id("c") not in store
+
+
+def test_live_returns_each_records_latest_vector_and_metadata(tmp_path):
+    store = DocumentStore(tmp_path)
+    store.sync(items(a="one", b="two"), Embed())
+    store.sync(items(a="one", b="longer"), Embed())
+    entries, matrix = store.live()
+    assert [(e["text"], e["meta"]) for e in entries] == [("one", {"url": "a"}), ("longer", {"url": "b"})]
+    assert matrix.tolist() == [[3.0, 1.0], [6.0, 1.0]]
+
+
+def test_reopened_store_replays_the_index(tmp_path):
+    DocumentStore(tmp_path).sync(items(a="one", b="two"), Embed())
+    DocumentStore(tmp_path).delete([record_id("a")])
+    store = DocumentStore(tmp_path)
+    embed = Embed()
+    store.sync(items(b="two"), embed)
+    assert embed.texts == []
+    assert [e["text"] for e in store.live()[0]] == ["two"]
+
+
+def test_compaction_drops_superseded_rows(tmp_path):
+    store = DocumentStore(tmp_path)
+    store.sync(items(a="one", b="two"), Embed())
+    for text in ("uno", "eins", "un"):
+        store.sync(items(a=text, b="two"), Embed())
+    assert store.generation > 0
+    assert store.rows == len(store) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"index.{store.generation}.jsonl", "meta.json", f"vectors.{store.generation}.f32"]
+    entries, matrix = DocumentStore(tmp_path).live()
+    assert [e["text"] for e in entries] == ["two", "un"]
+    assert matrix.tolist() == [[3.0, 1.0], [2.0, 1.0]]
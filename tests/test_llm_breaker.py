@@ -0,0 +1,94 @@
+import pytest
+
+import llm
+from llm import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    return clock
+
+
+class UpstreamError(Exception):
+    pass
+
+
+def fail():
+    raise UpstreamError("503")
+
+
+def fail_times(breaker, n):
+    for _ in range(n):
+        with pytest.raises(UpstreamError):
+            breaker.call(fail)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    fail_times(breaker, 2)
+    assert breaker.state == "closed"
+    fail_times(breaker, 1)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+
+def test_a_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    fail_times(breaker, 1)
+    assert breaker.call(lambda: "ok") == "ok"
+    fail_times(breaker, 1)
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    fail_times(breaker, 1)
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    fail_times(breaker, 3)
+    clock.now += 30
+    fail_times(breaker, 1)
+    assert breaker.state == "open"
+    clock.now += 29
+    assert breaker.state == "open"
+
+
+def test_only_one_trial_call_while_half_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    fail_times(breaker, 1)
+    clock.now += 30
+
+    def trial():
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "second caller")
+        return "trial"
+
+    assert breaker.call(trial) == "trial"
+
+
+def test_errors_that_are_not_failures_leave_the_circuit_closed(clock):
+    breaker = CircuitBreaker(failure_threshold=1, is_failure=lambda error: isinstance(error, UpstreamError))
+
+    def bad_request():
+        raise ValueError("400")
+
+    with pytest.raises(ValueError):
+        breaker.call(bad_request)
+    assert breaker.state == "closed"
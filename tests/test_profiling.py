@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from profiling import MemoryDiagnostics, SamplingProfiler
+
+
+def busy(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def wait_until_done(session, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not session.done:
+        assert time.monotonic() < deadline, "profile did not finish"
+        time.sleep(0.01)
+
+
+def test_session_samples_profiled_requests_and_ends_after_the_count():
+    profiler = SamplingProfiler()
+    session = profiler.start(requests=2, interval=0.001)
+    for _ in range(2):
+        with profiler.request():
+            busy(0.05)
+    wait_until_done(session)
+    assert session.status()["completed_requests"] == 2
+    assert session.samples > 0
+    assert any("test_profiling:busy" in line for line in session.collapsed().splitlines())
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in session.collapsed().splitlines())
+
+
+def test_nothing_is_sampled_outside_requests():
+    profiler = SamplingProfiler()
+    session = profiler.start(seconds=0.05, interval=0.001)
+    busy(0.05)
+    wait_until_done(session)
+    assert session.samples == 0
+
+
+def test_only_one_session_at_a_time():
+    profiler = SamplingProfiler()
+    session = profiler.start(seconds=0.05)
+    with pytest.raises(RuntimeError):
+        profiler.start()
+    wait_until_done(session)
+    profiler.start(seconds=0.01)
+
+
+class Leaked:
+    pass
+
+
+def test_memory_snapshots_report_growth_against_the_previous_one():
+    diagnostics = MemoryDiagnostics(frames=1)
+    try:
+        assert diagnostics.take()["baseline"]
+        grown = [Leaked() for _ in range(200)]
+        report = diagnostics.take()
+        assert not report["baseline"]
+        assert report["growth_by_type"].get("Leaked", 0) >= len(grown)
+        assert any("test_profiling.py" in line["traceback"][0] for line in report["growth_by_line"])
+    finally:
+        diagnostics.stop()
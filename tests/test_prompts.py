@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from prompts import build_chat_prompt  # noqa: E402
+
+
+def render(question, history, context, intent="general"):
+    return build_chat_prompt("map navigation").format_messages(
+        input=question, chat_history=history, context=context, intent=intent)
+
+
+def test_requests_share_the_prefix_up_to_the_per_request_part():
+    first = render("Where is the search box?", [], "record one")
+    second = render("How do I filter by year?", [], "record two", intent="calendar")
+    assert first[0] == second[0]  # The static instructions
+    assert "record one" in first[1].content and "{" not in first[0].content
+
+
+def test_a_follow_up_extends_the_earlier_turn_prefix():
+    history = [HumanMessage(content="Where is the search box?"), AIMessage(content="On the right-hand pane.")]
+    earlier = render("Where is the search box?", [], "record one")
+    later = render("And the calendar?", history, "record two")
+    assert later[0] == earlier[0]
+    assert later[1:3] == history  # The conversation comes before anything that changes per request
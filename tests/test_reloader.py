@@ -0,0 +1,81 @@
+import time
+
+from reloader import KnowledgeReloader
+
+
+class Builds:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, file_path, version):
+        if self.fail:
+            raise ValueError("bad knowledge file")
+        with open(file_path, encoding="utf-8") as f:
+            self.calls.append(version)
+            return (version, f.read())
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_reload_swaps_only_when_the_content_changes(tmp_path):
+    path = tmp_path / "knowledge.txt"
+    path.write_text("one")
+    build = Builds()
+    reloader = KnowledgeReloader(str(path), build, interval=0)
+    assert reloader.reload()
+    assert not reloader.reload()  # Same content
+    path.write_text("two")
+    assert reloader.reload()
+    assert reloader.current == (2, "two")
+    assert build.calls == [1, 2]
+
+
+def test_a_failed_build_keeps_the_previous_index(tmp_path):
+    path = tmp_path / "knowledge.txt"
+    path.write_text("one")
+    build = Builds()
+    reloader = KnowledgeReloader(str(path), build, interval=0)
+    reloader.reload()
+    build.fail = True
+    path.write_text("two")
+    assert not reloader.reload()
+    assert reloader.current == (1, "one")
+    assert reloader.stats()["failed_reloads"] == 1
+
+
+def test_watcher_reloads_and_stops(tmp_path):
+    path = tmp_path / "knowledge.txt"
+    path.write_text("one")
+    reloader = KnowledgeReloader(str(path), Builds(), interval=0.01)
+    reloader.reload()
+    reloader.start()
+    path.write_text("changed")
+    wait_for(lambda: reloader.version == 2)
+    thread = reloader._thread
+    reloader.stop()
+    assert not thread.is_alive()
+    path.write_text("changed again")
+    time.sleep(0.05)
+    assert reloader.version == 2
+
+
+def test_after_fork_keeps_the_index_and_watches_again(tmp_path):
+    path = tmp_path / "knowledge.txt"
+    path.write_text("one")
+    build = Builds()
+    reloader = KnowledgeReloader(str(path), build, interval=0.01)
+    reloader.reload()
+    reloader.start()
+    reloader.stop()  # As the master does before forking
+    reloader.lock.acquire()  # A lock copied while held must not block the child
+    reloader.after_fork()
+    assert reloader.current == (1, "one") and build.calls == [1]
+    path.write_text("two")
+    wait_for(lambda: reloader.current == (2, "two"))
+    reloader.stop()
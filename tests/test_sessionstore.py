@@ -0,0 +1,98 @@
+import pytest
+
+import sessionstore
+from sessionstore import CACHE_TTL, MAX_TURNS, SESSION_TTL, FallbackStore, LocalStore, SQLiteStore, create_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessionstore.time, "time", clock)
+    monkeypatch.setattr(sessionstore.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def store(request, tmp_path, clock):
+    return LocalStore() if request.param == "local" else SQLiteStore(str(tmp_path / "sessions.db"))
+
+
+def turn(i):
+    return {"question": f"q{i}", "answer": f"a{i}"}
+
+
+def test_history_keeps_the_last_turns_in_order(store, clock):
+    for i in range(MAX_TURNS + 2):
+        clock.now += 1
+        store.save("s", turn(i))
+    turns, _ = store.load("s", "key")
+    assert turns == [turn(i) for i in range(2, MAX_TURNS + 2)]
+
+
+def test_session_expires_after_its_ttl(store, clock):
+    store.save("s", turn(0))
+    clock.now += SESSION_TTL - 1
+    assert store.load("s", "key")[0] == [turn(0)]
+    clock.now += 2
+    assert store.load("s", "key")[0] == []
+
+
+def test_cached_answer_expires_after_its_ttl(store, clock):
+    store.save(None, turn(0), "key", {"reply": "cached"})
+    assert store.load(None, "key") == ([], {"reply": "cached"})
+    clock.now += CACHE_TTL + 1
+    assert store.load(None, "key") == ([], None)
+
+
+def test_sqlite_prunes_expired_rows(tmp_path, clock):
+    store = SQLiteStore(str(tmp_path / "sessions.db"))
+    store.save("old", turn(0), "old-key", {"reply": "old"})
+    clock.now += max(SESSION_TTL, CACHE_TTL) + 1
+    store.save("new", turn(1), "new-key", {"reply": "new"})
+    db = store._connection()
+    assert db.execute("SELECT DISTINCT session FROM turns").fetchall() == [("new",)]
+    assert db.execute("SELECT key FROM answers").fetchall() == [("new-key",)]
+
+
+def test_sqlite_sessions_are_shared_between_store_instances(tmp_path, clock):
+    path = str(tmp_path / "sessions.db")
+    SQLiteStore(path).save("s", turn(0))
+    assert SQLiteStore(path).load("s", "key")[0] == [turn(0)]
+
+
+class Broken:
+    name = "broken"
+
+    def __init__(self):
+        self.calls = 0
+
+    def load(self, *args):
+        self.calls += 1
+        raise ConnectionError("down")
+
+    save = load
+
+
+def test_fallback_serves_locally_until_the_retry(clock):
+    primary = Broken()
+    store = FallbackStore(primary, retry_after=30)
+    store.save("s", turn(0))
+    assert store.load("s", "key") == ([turn(0)], None)
+    assert primary.calls == 1  # Not retried within retry_after
+    assert store.stats()["degraded"]
+    clock.now += 30
+    store.load("s", "key")
+    assert primary.calls == 2
+
+
+def test_create_store_rejects_unknown_urls():
+    with pytest.raises(ValueError):
+        create_store("memcached://localhost")
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+import sharedindex
+from sharedindex import SharedVectorIndex, diff
+
+
+class Embeddings:
+    """Fake embeddings: a fixed direction per text, counting the texts embedded."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def vector(self, text):
+        return np.random.default_rng(sum(text.encode("utf-8"))).normal(size=8)
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.vector(text)
+
+
+def doc(record_id, text, category="maps"):
+    return SimpleNamespace(page_content=text, metadata={"id": record_id, "category": category})
+
+
+DOCS = [doc("a", "search box"), doc("b", "calendar icon"), doc("c", "immunisation rates", "health")]
+
+
+def test_second_load_embeds_nothing_and_maps_the_file(tmp_path):
+    embeddings = Embeddings()
+    first = SharedVectorIndex.load_or_build(DOCS, embeddings, index_dir=str(tmp_path))
+    second = SharedVectorIndex.load_or_build(DOCS, embeddings, index_dir=str(tmp_path))
+    assert (first.embedded, second.embedded) == (3, 0)
+    assert len(embeddings.embedded) == 3
+    assert isinstance(second.vectors, np.memmap)
+    assert np.allclose(np.linalg.norm(second.vectors, axis=1), 1.0)
+
+
+def test_new_version_embeds_only_added_and_changed_records(tmp_path):
+    SharedVectorIndex.load_or_build(DOCS, Embeddings(), index_dir=str(tmp_path))
+    docs = [DOCS[0], doc("b", "calendar icon, top right"), doc("d", "school terms")]
+    assert diff(docs, str(tmp_path)) == {"added": ["d"], "changed": ["b"], "unchanged": ["a"], "removed": ["c"]}
+    embeddings = Embeddings()
+    index = SharedVectorIndex.load_or_build(docs, embeddings, index_dir=str(tmp_path))
+    assert embeddings.embedded == ["calendar icon, top right", "school terms"]
+    assert diff(docs, str(tmp_path))["unchanged"] == ["a", "b", "d"]
+    assert np.allclose(index.vectors[0], sharedindex.normalize_rows(Embeddings().vector("search box")))
+
+
+def test_old_versions_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharedindex, "KEEP_VERSIONS", 2)
+    for i in range(4):
+        SharedVectorIndex.load_or_build([doc("a", f"version {i}")], Embeddings(), index_dir=str(tmp_path))
+    assert len([name for name in tmp_path.iterdir() if name.suffix == ".npy"]) == 2
+
+
+def test_search_ranks_by_similarity_and_applies_the_filter(tmp_path):
+    index = SharedVectorIndex.load_or_build(DOCS, Embeddings(), index_dir=str(tmp_path))
+    results = index.similarity_search_with_relevance_scores("calendar icon", k=2)
+    assert results[0][0] is DOCS[1]
+    assert results[0][1] >= results[1][1]
+    filtered = index.similarity_search_with_relevance_scores("calendar icon", k=3, filter={"category": "health"})
+    assert [d for d, _ in filtered] == [DOCS[2]]
+
+
+def test_sidecar_is_computed_once(tmp_path):
+    index = SharedVectorIndex.load_or_build(DOCS, Embeddings(), index_dir=str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"rows": len(index.vectors)}
+
+    assert index.sidecar("stats", compute) == {"rows": 3}
+    again = SharedVectorIndex.load_or_build(DOCS, Embeddings(), index_dir=str(tmp_path))
+    assert again.sidecar("stats", compute) == {"rows": 3}
+    assert len(calls) == 1
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, normalize_question
+
+
+def run_followers(flight, key, n):
+    """Start ``n`` callers of ``key`` once the leader is running; returns their threads and outcomes."""
+    outcomes = []
+
+    def follow():
+        try:
+            outcomes.append(("result", flight.do(key, lambda: "follower ran")))
+        except Exception as e:
+            outcomes.append(("error", e))
+
+    threads = [threading.Thread(target=follow) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_for_followers(flight, n):
+    while flight.stats()["suppressed"] < n:
+        time.sleep(0.001)
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    followers = []
+
+    def leader():
+        followers.extend(run_followers(flight, "q", 3))
+        wait_for_followers(flight, 3)
+        return "answer"
+
+    assert flight.do("q", leader) == "answer"
+    threads, outcomes = followers
+    for thread in threads:
+        thread.join()
+    assert outcomes == [("result", "answer")] * 3
+    assert flight.stats() == {"executed": 1, "suppressed": 3, "in_flight": 0}
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    error = RuntimeError("upstream failed")
+    followers = []
+
+    def leader():
+        followers.extend(run_followers(flight, "q", 2))
+        wait_for_followers(flight, 2)
+        raise error
+
+    with pytest.raises(RuntimeError):
+        flight.do("q", leader)
+    threads, outcomes = followers
+    for thread in threads:
+        thread.join()
+    assert outcomes == [("error", error)] * 2
+
+
+def test_a_failed_key_runs_again_on_the_next_call():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("first try")
+
+    with pytest.raises(ValueError):
+        flight.do("q", fail)
+    assert flight.do("q", lambda: "retried") == "retried"
+    assert flight.stats()["executed"] == 2
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: flight.do("b", lambda: "inner")) == "inner"
+
+
+def test_questions_differing_in_case_and_punctuation_share_a_key():
+    assert normalize_question("Where is the  SEARCH box?") == normalize_question("where is the search box")
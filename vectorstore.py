@@ -0,0 +1,172 @@
+# vectorstore.py
+# Compact, memory-mappable storage for chunk embeddings.
+#
+# Layout inside the vector directory:
+#   vectors.npy  - (rows, dim) matrix of unit-length embeddings, float16 or int8
+#   scales.npy   - float32 per-row scale factors (int8 only): vector ~= row * scale
+#   row_ids.npy  - int64 sidecar: matrix row -> row of the chunk text table
+#   meta.json    - dtype, rows, dim
+#
+# All three arrays are opened with mmap_mode="r", so loading copies nothing and
+# pages are shared between processes reading the same file.
+#
+#   python vectorstore.py data/processed/vectors   # footprint and recall report per dtype
+import json
+from pathlib import Path
+
+import numpy as np
+
+DTYPES = ("float32", "float16", "int8")
+SCORE_BLOCK_ROWS = 65536  # Rows dequantized at a time when scoring
+QUERY_BLOCK_ROWS = 256  # Queries scored together by top_k_scores
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def save_vectors(vector_dir: Path, embeddings, row_ids=None, dtype: str = "float16") -> Path:
+    """Normalize, quantize and write embeddings as a vector directory."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {DTYPES}")
+    vector_dir = Path(vector_dir)
+    vector_dir.mkdir(parents=True, exist_ok=True)
+    matrix = normalize_rows(embeddings)
+    if row_ids is None:
+        row_ids = np.arange(len(matrix), dtype=np.int64)
+
+    if dtype == "int8":
+        # Symmetric per-row quantization: the largest component of each row maps to 127
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(vector_dir / "vectors.npy", np.round(matrix / scales[:, None]).astype(np.int8))
+        np.save(vector_dir / "scales.npy", scales.astype(np.float32))
+    else:
+        np.save(vector_dir / "vectors.npy", matrix.astype(dtype))
+        (vector_dir / "scales.npy").unlink(missing_ok=True)
+    np.save(vector_dir / "row_ids.npy", np.asarray(row_ids, dtype=np.int64))
+    # meta.json goes last, so a directory is only readable once every array is complete
+    (vector_dir / "meta.json").write_text(json.dumps({"dtype": dtype, "rows": len(matrix), "dim": matrix.shape[1]}))
+    return vector_dir
+
+
+class VectorFile:
+    def __init__(self, vector_dir: Path):
+        self.vector_dir = Path(vector_dir)
+        self.meta = json.loads((self.vector_dir / "meta.json").read_text())
+        self.vectors = np.load(self.vector_dir / "vectors.npy", mmap_mode="r")
+        self.row_ids = np.load(self.vector_dir / "row_ids.npy", mmap_mode="r")
+        scales_path = self.vector_dir / "scales.npy"
+        self.scales = np.load(scales_path, mmap_mode="r") if self.meta["dtype"] == "int8" else None
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.vectors, self.row_ids, self.scales) if a is not None)
+
+    def _block_scores(self, queries: np.ndarray, start: int) -> np.ndarray:
+        # Dequantize one block of rows so only that block is ever held as float32
+        block = np.asarray(self.vectors[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+        block_scores = queries @ block.T
+        if self.scales is not None:
+            block_scores *= self.scales[start:start + SCORE_BLOCK_ROWS]
+        return block_scores
+
+    def scores(self, queries) -> np.ndarray:
+        """Cosine similarity of one query (dim,) or many (n, dim) against every row."""
+        queries = normalize_rows(queries)
+        out = np.empty(queries.shape[:-1] + (len(self.vectors),), dtype=np.float32)
+        for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+            block_scores = self._block_scores(queries, start)
+            out[..., start:start + block_scores.shape[-1]] = block_scores
+        return out
+
+    def top_k_scores(self, queries, k: int = 10):
+        """Matrix rows and scores of the k best rows per query, best first.
+
+        Queries and rows are scored a block at a time and only the running top k
+        of each query is kept, so the full (queries, rows) matrix is never built.
+        """
+        queries = normalize_rows(queries)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        k = min(k, len(self.vectors))
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for q in range(0, len(queries), QUERY_BLOCK_ROWS):
+            block_queries = queries[q:q + QUERY_BLOCK_ROWS]
+            best_rows = np.empty((len(block_queries), 0), dtype=np.int64)
+            best_scores = np.empty((len(block_queries), 0), dtype=np.float32)
+            for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS):
+                block_scores = self._block_scores(block_queries, start)
+                block_rows = np.broadcast_to(np.arange(start, start + block_scores.shape[1]), block_scores.shape)
+                best_scores = np.concatenate([best_scores, block_scores], axis=1)
+                best_rows = np.concatenate([best_rows, block_rows], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            rows[q:q + len(block_queries)] = np.take_along_axis(best_rows, order, axis=1)
+            scores[q:q + len(block_queries)] = np.take_along_axis(best_scores, order, axis=1)
+        return (rows[0], scores[0]) if single else (rows, scores)
+
+    def top_k(self, queries, k: int = 10) -> np.ndarray:
+        """Row ids of the k best rows per query, best first."""
+        rows, _ = self.top_k_scores(queries, k)
+        return np.asarray(self.row_ids)[rows]
+
+
+def recall_at_k(exact: np.ndarray, approx: np.ndarray) -> float:
+    """Mean fraction of the exact top-k ids that the approximate top-k also found."""
+    pairs = list(zip(np.atleast_2d(exact), np.atleast_2d(approx)))
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in pairs])) if pairs else 0.0
+
+
+def compare_dtypes(embeddings, vector_dir: Path, k: int = 10, n_queries: int = 200, seed: int = 0) -> list:
+    """Footprint and recall@k of each dtype against the float32 matrix.
+
+    Queries are stored rows plus noise, so they resemble real questions near the corpus.
+    """
+    matrix = normalize_rows(embeddings)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(matrix), size=min(n_queries, len(matrix)), replace=False)
+    queries = matrix[picks] + rng.normal(scale=0.5 / np.sqrt(matrix.shape[1]), size=(len(picks), matrix.shape[1]))
+
+    report = []
+    exact = None
+    for dtype in DTYPES:
+        vectors = VectorFile(save_vectors(Path(vector_dir) / dtype, matrix, dtype=dtype))
+        found = vectors.top_k(queries, k)
+        if exact is None:
+            exact = found
+        report.append({"dtype": dtype, "bytes": vectors.nbytes, f"recall@{k}": recall_at_k(exact, found)})
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Compare float32/float16/int8 embedding storage")
+    parser.add_argument("embeddings", type=Path, help="vector directory, or a parquet file with an 'embedding' list column")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.embeddings.is_dir():
+        source = VectorFile(args.embeddings)
+        data = np.asarray(source.vectors, dtype=np.float32)
+        if source.scales is not None:
+            data *= np.asarray(source.scales)[:, None]
+    else:
+        data = np.vstack(pd.read_parquet(args.embeddings, engine="pyarrow")["embedding"].to_numpy())
+    with tempfile.TemporaryDirectory() as tmp:
+        for row in compare_dtypes(data, tmp, args.k):
+            print(f"{row['dtype']:>8}: {row['bytes'] / 1e6:8.2f} MB  recall@{args.k} {row[f'recall@{args.k}']:.4f}")
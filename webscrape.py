@@ -6,10 +6,14 @@ import PyPDF2
 import time
 import csv
 import random
+from dedup import Deduplicator, canonicalize_url
 
 # Set to store visited URLs to avoid revisiting
 visited_urls = set()
 data_to_save = []  # List to store the data for CSV
+saved_links = set()  # Canonical URLs already written to data_to_save
+content_dedup = Deduplicator()  # Fingerprints of page/PDF content already seen
+links_found = 0  # Total links discovered, including repeats of the same nav links
 
 # Function to make HTTP requests with rate limit handling
 def make_request(url):
@@ -31,13 +35,15 @@ def make_request(url):
         return None
 
 def scrape_website(url):
-    # Skip if URL is already visited
-    if url in visited_urls:
+    global links_found
+    # Skip if URL (or a query/fragment/trailing-slash variant of it) is already visited
+    key = canonicalize_url(url)
+    if key in visited_urls:
         return
 
     try:
         # Mark URL as visited
-        visited_urls.add(url)
+        visited_urls.add(key)
 
         # Send HTTP request to the URL
         response = make_request(url)
@@ -55,6 +61,11 @@ def scrape_website(url):
             page_title = soup.title.string if soup.title else 'No title'
             print("Page Title:", page_title)
 
+            # Don't follow links again from a page whose content was already seen under another URL
+            if content_dedup.is_duplicate(soup.get_text()):
+                print(f"Skipping duplicate content at {url}")
+                return
+
             # Find all links in the current page
             links = soup.find_all('a', href=True)
 
@@ -69,11 +80,16 @@ def scrape_website(url):
                 # Print the link URL and its title text
                 print(f"Link Text: {link_text}, URL: {full_url}")
 
-                # Add data to list for CSV output with Title and Link/Content format
-                data_to_save.append({
-                    'Title': link_text,
-                    'Link/Content': full_url
-                })
+                # Add data to list for CSV output with Title and Link/Content format,
+                # storing each distinct link only once
+                links_found += 1
+                link_key = canonicalize_url(full_url)
+                if link_key not in saved_links:
+                    saved_links.add(link_key)
+                    data_to_save.append({
+                        'Title': link_text,
+                        'Link/Content': full_url
+                    })
 
                 # Ensure we only visit links from the same domain
                 if urlparse(full_url).netloc == urlparse(url).netloc:
@@ -110,6 +126,11 @@ def scrape_pdf(url):
                 if text:
                     pdf_text += text
 
+        # Skip PDFs whose text was already saved from another URL
+        if content_dedup.is_duplicate(pdf_text):
+            print(f"Skipping duplicate PDF content at {url}")
+            return
+
         # Add PDF content to list for CSV output with Title and Link/Content format
         data_to_save.append({
             'Title': 'PDF Content',  # Static title indicating this is PDF content
@@ -138,6 +159,11 @@ def save_to_csv(filename, data):
 start_url = 'https://australianchildatlas.com'
 scrape_website(start_url)
 
+# Report how much duplicate data was dropped
+link_ratio = 1 - len(saved_links) / links_found if links_found else 0.0
+print(f"Links: found {links_found}, saved {len(saved_links)}, dedup ratio {link_ratio:.1%}")
+print(f"Content: {content_dedup.report()}")
+
 # Save the collected data to CSV
 save_to_csv('scraped_datav3.csv', data_to_save)
 S
\ No newline at end of file